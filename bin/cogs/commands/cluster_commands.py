@@ -0,0 +1,115 @@
+import asyncio
+import math
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from bin.utils.cluster import ClusterConfig
+from bin.utils.cluster_ipc import IpcClient, IpcError
+
+
+class ClusterCommands(commands.Cog):
+    """Cross-cluster stats and admin commands, answered over the launcher's IPC channel."""
+
+    def __init__(self, bot: commands.Bot, cluster: ClusterConfig, ipc: IpcClient = None):
+        self.bot = bot
+        self.cluster = cluster
+        self.ipc = ipc
+        self._closing = None
+
+    async def cog_load(self):
+        if self.ipc is not None:
+            self.ipc.handler("stats")(self.ipc_stats)
+            self.ipc.handler("shutdown")(self.ipc_shutdown)
+
+    def local_stats(self):
+        """This process's numbers, as sent to other clusters."""
+        latencies = getattr(self.bot, "latencies", None) or [(self.bot.shard_id or 0, self.bot.latency)]
+        music = self.bot.get_cog("MusicCog")
+        return {
+            "shards": [shard_id for shard_id, _ in latencies],
+            "latency_ms": max(
+                (round(latency * 1000) for _, latency in latencies if math.isfinite(latency)), default=None
+            ),
+            "guilds": len(self.bot.guilds),
+            "members": sum(guild.member_count or 0 for guild in self.bot.guilds),
+            "voice_connections": len(self.bot.voice_clients),
+            "playing": len(music.now_playing) if music else 0,
+            "queued_tracks": sum(len(queue) for queue in music.song_queues.values()) if music else 0,
+        }
+
+    async def ipc_stats(self):
+        return self.local_stats()
+
+    async def ipc_shutdown(self):
+        print("Shutdown requested by the cluster launcher.")
+        if self._closing is None:
+            self._closing = asyncio.create_task(self._close_soon())
+        return True
+
+    async def _close_soon(self):
+        await asyncio.sleep(1)  # Let the reply reach the launcher first.
+        await self.bot.close()
+
+    @app_commands.command(name="clusterstats", description="Show guild, voice and latency statistics for every cluster.")
+    @app_commands.default_permissions(manage_guild=True)
+    async def clusterstats(self, interaction: discord.Interaction):
+        # Bot-wide numbers: only for the owner, or server managers.
+        if not await self.bot.is_owner(interaction.user) and not (
+                interaction.guild and interaction.user.guild_permissions.manage_guild):
+            await interaction.response.send_message("You need 'Manage Server' permissions to use this command.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        errors = {}
+        if self.ipc is not None and self.ipc.connected:
+            try:
+                results, errors = await self.ipc.request("stats")
+            except IpcError as e:
+                results, errors = {self.cluster.cluster_id: self.local_stats()}, {"launcher": str(e)}
+        else:
+            results = {self.cluster.cluster_id: self.local_stats()}
+
+        lines = []
+        for cluster_id, stats in sorted(results.items()):
+            shards = ", ".join(str(shard_id) for shard_id in stats["shards"])
+            latency = f"{stats['latency_ms']} ms" if stats["latency_ms"] is not None else "n/a"
+            here = " (this one)" if cluster_id == self.cluster.cluster_id else ""
+            lines.append(
+                f"**Cluster {cluster_id}**{here} — shards {shards} | Latency: {latency}\n"
+                f"Guilds: {stats['guilds']} | Members: {stats['members']} | Voice: {stats['voice_connections']} | "
+                f"Playing: {stats['playing']} | Queued: {stats['queued_tracks']}"
+            )
+        for cluster_id, error in sorted(errors.items(), key=str):
+            lines.append(f"**Cluster {cluster_id}** — no answer ({error})")
+        lines.append(
+            f"**Total** — Guilds: {sum(stats['guilds'] for stats in results.values())} | "
+            f"Voice: {sum(stats['voice_connections'] for stats in results.values())}"
+        )
+        await interaction.followup.send("\n".join(lines), ephemeral=True)
+
+    @app_commands.command(name="clusterrestart", description="Restart one cluster process (bot owner only).")
+    @app_commands.describe(cluster="The cluster to restart, as shown by /clusterstats.")
+    async def clusterrestart(self, interaction: discord.Interaction, cluster: int):
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("Only the bot owner can restart clusters.", ephemeral=True)
+            return
+        if self.ipc is None or not self.ipc.connected:
+            await interaction.response.send_message("This bot isn't running under the cluster launcher.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        try:
+            _, errors = await self.ipc.request("shutdown", target=cluster)
+        except IpcError as e:
+            errors = {cluster: str(e)}
+        if errors:
+            await interaction.followup.send(f"Could not restart cluster {cluster}: {errors[cluster]}", ephemeral=True)
+        else:
+            await interaction.followup.send(
+                f"Cluster {cluster} is shutting down; the launcher will start it again.", ephemeral=True
+            )
+
+
+async def setup(bot: commands.Bot, cluster: ClusterConfig, ipc: IpcClient = None):
+    await bot.add_cog(ClusterCommands(bot, cluster, ipc))
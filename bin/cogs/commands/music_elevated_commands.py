@@ -1,32 +1,29 @@
-from random import random
 import discord
 from discord.ext import commands
 from discord import app_commands
-from collections import deque
-import json
 
-from bin.cogs.music_cog import MusicCog
+from bin.cogs.music_cog import DEFAULT_VOLUME, MusicCog
+from bin.utils.config_service import ConfigService
+from bin.utils.guild_settings import migrate_names_to_ids
+
+LEGACY_NAME_FIELDS = {"music_role": ("music_role_id", "roles")}
 
 class ElevatedMusicCommands(commands.Cog):
-    def __init__(self, bot: commands.Bot, music_cog: 'MusicCog'):
+    def __init__(self, bot: commands.Bot, music_cog: 'MusicCog', config: ConfigService):
         self.bot = bot
         self.music_cog = music_cog
+        self.config = config
         super().__init__()
-        self.load_config()
-
-    def load_config(self):
-        try:
-            with open("music_config.json", "r") as f:
-                self.config = json.load(f)
-        except FileNotFoundError:
-            self.config = {}
-        except json.JSONDecodeError:
-            print("Error: music_config.json contains invalid JSON. Using empty configuration.")
-            self.config = {}
-
-    def save_config(self):
-        with open("music_config.json", "w") as f:
-            json.dump(self.config, f, indent=4)
+
+    def migrate_guild(self, guild: discord.Guild):
+        settings = self.config.section(guild.id, "music")
+        if settings and migrate_names_to_ids(settings, guild, LEGACY_NAME_FIELDS):
+            self.config.mark_dirty(guild.id)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        for guild in self.bot.guilds:
+            self.migrate_guild(guild)
 
     @app_commands.command(name="setmusicrole", description="Sets the music role for this server.")
     async def setmusicrole(self, interaction: discord.Interaction, role: discord.Role):
@@ -34,33 +31,29 @@ class ElevatedMusicCommands(commands.Cog):
             await interaction.response.send_message("You need 'Manage Server' permissions to use this command.", ephemeral=True)
             return
 
-        guild_id = str(interaction.guild.id)
-        if guild_id not in self.config:
-            self.config[guild_id] = {}
-        self.config[guild_id]["music_role"] = role.name
-        self.save_config()
+        self.config.set(interaction.guild.id, "music", "music_role_id", role.id)
+        self.config.pop(interaction.guild.id, "music", "music_role")
         await interaction.response.send_message(f"Music role set to {role.name}", ephemeral=True)
 
     async def check_music_role(self, interaction: discord.Interaction):
         """Checks if the user has the required music role."""
-        guild_id = str(interaction.guild.id)
-        required_role_name = self.config.get(guild_id, {}).get("music_role")
+        self.migrate_guild(interaction.guild)
+        required_role_id = self.config.get(interaction.guild.id, "music", "music_role_id")
 
-        if not required_role_name:
+        if not required_role_id:
             await interaction.response.send_message("No music role is set yet. Please have an admin use `/setmusicrole` first.", ephemeral=True)
             return False  # No role set, disallow command usage
 
-        role = discord.utils.get(interaction.guild.roles, name=required_role_name)
+        if interaction.user.get_role(required_role_id) is not None:
+            return True
 
+        role = interaction.guild.get_role(required_role_id)
         if not role:
-            await interaction.response.send_message(f"Music role '{required_role_name}' not found.", ephemeral=True)
+            await interaction.response.send_message("The music role no longer exists. Please have an admin use `/setmusicrole` again.", ephemeral=True)
             return False
 
-        if role in interaction.user.roles:
-            return True
-        else:
-            await interaction.response.send_message(f"You need the '{required_role_name}' role to use this command.", ephemeral=True)
-            return False
+        await interaction.response.send_message(f"You need the '{role.name}' role to use this command.", ephemeral=True)
+        return False
 
     @app_commands.command(name="stop", description="Stop playback and clear the queue.")
     async def stop(self, interaction: discord.Interaction):
@@ -76,6 +69,8 @@ class ElevatedMusicCommands(commands.Cog):
 
         if guild_id in self.music_cog.song_queues:
             self.music_cog.song_queues[guild_id].clear()
+        self.music_cog.on_queue_changed(guild_id)
+        self.music_cog.cancel_playlist_ingestion(guild_id)
 
         if voice_client.is_playing() or voice_client.is_paused():
             voice_client.stop()
@@ -99,15 +94,34 @@ class ElevatedMusicCommands(commands.Cog):
             await interaction.response.send_message("Invalid song position.")
             return
 
-        song_list = list(self.music_cog.song_queues[guild_id])
-        moved_song = song_list.pop(position - 1)
-        song_list.insert(0, moved_song)
-        self.music_cog.song_queues[guild_id] = deque(song_list)
+        moved_song = self.music_cog.song_queues[guild_id].move(position - 1, 0)
+        self.music_cog.on_queue_changed(guild_id)
 
         await interaction.response.send_message(
-            f"Moved '{moved_song[1]}' to the front of the queue."
+            f"Moved '{moved_song.title}' to the front of the queue."
         )
 
+    @app_commands.command(name="remove", description="Remove a song from the queue.")
+    @app_commands.describe(position="The position of the song in the queue (e.g., 1, 2, 3).")
+    async def remove(self, interaction: discord.Interaction, position: int):
+        if not await self.check_music_role(interaction):
+            return
+
+        guild_id = str(interaction.guild.id)
+
+        if guild_id not in self.music_cog.song_queues or not self.music_cog.song_queues[guild_id]:
+            await interaction.response.send_message("The queue is empty.")
+            return
+
+        if position <= 0 or position > len(self.music_cog.song_queues[guild_id]):
+            await interaction.response.send_message("Invalid song position.")
+            return
+
+        removed_song = self.music_cog.song_queues[guild_id].remove(position - 1)
+        self.music_cog.on_queue_changed(guild_id)
+
+        await interaction.response.send_message(f"Removed '{removed_song.title}' from the queue.")
+
     @app_commands.command(name="volume", description="Set or get the playback volume.")
     @app_commands.describe(volume="Volume level (0-100)")
     async def volume(self, interaction: discord.Interaction, volume: int = None):
@@ -122,16 +136,12 @@ class ElevatedMusicCommands(commands.Cog):
         guild_id = str(interaction.guild.id)
 
         if volume is None:
-            current_volume = self.music_cog.volumes.get(guild_id, 1.0)
+            current_volume = self.music_cog.volumes.get(guild_id, DEFAULT_VOLUME)
             await interaction.response.send_message(f"Current volume: {int(current_volume * 100)}%")
             return
 
         if 0 <= volume <= 100:
-            volume_float = volume / 100.0
-            self.music_cog.volumes[guild_id] = volume_float
-
-            if voice_client.source:
-                voice_client.source.volume = volume_float
+            self.music_cog.set_volume(guild_id, volume / 100.0)
 
             await interaction.response.send_message(f"Volume set to {volume}%")
         else:
@@ -155,21 +165,56 @@ class ElevatedMusicCommands(commands.Cog):
             return
 
         guild_id = str(interaction.guild_id)
-        if guild_id not in self.song_queues or not self.song_queues[guild_id]:
+        if guild_id not in self.music_cog.song_queues or not self.music_cog.song_queues[guild_id]:
             await interaction.response.send_message("The queue is empty.")
             return
 
-        song_list = list(self.song_queues[guild_id])
-        random.shuffle(song_list)
-        self.song_queues[guild_id] = deque(song_list)
+        self.music_cog.song_queues[guild_id].shuffle()
+        self.music_cog.on_queue_changed(guild_id)
 
         await interaction.response.send_message("Queue shuffled!")
 
-async def setup(bot: commands.Bot, music_cog: 'MusicCog'):
+    @app_commands.command(name="musicstats", description="Show yt-dlp extraction and cache statistics.")
+    async def musicstats(self, interaction: discord.Interaction):
+        if not await self.check_music_role(interaction):
+            return
+
+        pool = self.music_cog.extraction_pool.stats()
+        cache = self.music_cog.resolution_cache.stats()
+        message = (
+            f"**Extraction pool** ({pool['mode']}, {pool['max_workers']} workers)\n"
+            f"Queued: {pool['queue_depth']} | Running: {pool['in_flight']} | "
+            f"Done: {pool['completed']} | Failed: {pool['failed']}\n"
+            f"Wait: avg {pool['avg_wait']:.2f}s, max {pool['max_wait']:.2f}s, last {pool['last_wait']:.2f}s\n"
+            f"**Resolution cache**\n"
+            f"Entries: {cache['size']}/{cache['maxsize']} | Hits: {cache['hits']} | "
+            f"Misses: {cache['misses']} | Hit ratio: {cache['hit_ratio']:.0%}"
+        )
+        graph = self.music_cog.related_graph.stats()
+        message += (
+            f"\n**Autoplay graph**\n"
+            f"Nodes in memory: {graph['nodes_in_memory']} | Hits: {graph['hits']} | Misses: {graph['misses']}"
+        )
+        index = self.music_cog.search_index.stats()
+        message += (
+            f"\n**Search index**\n"
+            f"Tracks: {index['tracks']} | Searches: {index['queries']} | "
+            f"Skipped yt-dlp: {index['hits']} | Searched: {index['misses']}"
+        )
+        if self.music_cog.audio_cache is not None:
+            audio = self.music_cog.audio_cache.stats()
+            message += (
+                f"\n**Audio cache** ({audio['entries']} tracks, {audio['downloading']} downloading)\n"
+                f"Disk: {audio['bytes_used'] / 1048576:.0f}/{audio['max_bytes'] / 1048576:.0f} MB | "
+                f"Hits: {audio['hits']} | Misses: {audio['misses']} | Hit ratio: {audio['hit_ratio']:.0%}"
+            )
+        await interaction.response.send_message(message, ephemeral=True)
+
+async def setup(bot: commands.Bot, music_cog: 'MusicCog', config: ConfigService):
     if music_cog is None:
         print("MusicCog not found. Adding ElevatedMusicCommands without core functionality.")
         music_cog = MusicCog(bot)
         return
     
-    await bot.add_cog(ElevatedMusicCommands(bot, music_cog))
+    await bot.add_cog(ElevatedMusicCommands(bot, music_cog, config))
     print("Admin Music Controls Added")
\ No newline at end of file
@@ -1,10 +1,11 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from collections import deque
 
 from bin.cogs.music_cog import MusicCog
 
+QUEUE_DISPLAY_LIMIT = 20  # Keeps /queue well inside Discord's 2000 character limit
+
 class GeneralMusicControls(commands.Cog):
     def __init__(self, bot: commands.Bot, music_cog: 'MusicCog'):
         self.bot = bot
@@ -19,9 +20,12 @@ class GeneralMusicControls(commands.Cog):
             await interaction.response.send_message("The queue is empty.")
             return
 
+        queue = self.music_cog.song_queues[guild_id]
         queue_list = "\n".join(
-            f"{i+1}. {title}" for i, (query, title) in enumerate(self.music_cog.song_queues[guild_id])
+            f"{i+1}. {track.title}" for i, track in enumerate(queue[:QUEUE_DISPLAY_LIMIT])
         )
+        if len(queue) > QUEUE_DISPLAY_LIMIT:
+            queue_list += f"\n...and {len(queue) - QUEUE_DISPLAY_LIMIT} more"
         await interaction.response.send_message(f"**Current Queue:**\n{queue_list}")
 
     @app_commands.command(name="pause", description="Pause the currently playing song.")
@@ -1,18 +1,49 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from collections import deque
+import asyncio
+from typing import List
 
 from bin.cogs.music_cog import MusicCog
+from bin.utils.extraction_pool import PRIORITY_BACKGROUND
+from bin.utils.track_queue import Track
+
+# The first page is kept small so playback starts quickly; later pages double up to the cap.
+PLAYLIST_FIRST_PAGE = 10
+PLAYLIST_MAX_PAGE = 800
+
+
+def playlist_page_opts(start, end):
+    return {
+        'format': 'bestaudio/best',
+        'extract_flat': 'in_playlist',  # Titles and URLs only, each song is resolved when it plays
+        'noplaylist': False,  # Allow playlists.
+        'playlist_items': f'{start}-{end}',
+        'quiet': True,
+        'no_warnings': True,
+    }
 
 class AddSongs(commands.Cog):
     def __init__(self, bot: commands.Bot, music_cog: 'MusicCog'):
         self.bot = bot
         self.music_cog = music_cog  # Store a reference to the MusicCog
         super().__init__()
- 
+
+    async def song_query_autocomplete(
+            self,
+            interaction: discord.Interaction,
+            current: str,
+    ) -> List[app_commands.Choice[str]]:
+        # Served from memory: autocomplete has to answer within Discord's 3 second window.
+        return [
+            app_commands.Choice(name=track.title[:100], value=track.url)
+            for track in self.music_cog.search_index.suggest(current)
+            if len(track.url) <= 100
+        ]
+
     @app_commands.command(name="play", description="Play a song (searches YouTube).")
     @app_commands.describe(song_query="Search query or URL")
+    @app_commands.autocomplete(song_query=song_query_autocomplete)
     async def play(self, interaction: discord.Interaction, song_query: str):
         await interaction.response.defer()
 
@@ -29,6 +60,36 @@ class AddSongs(commands.Cog):
         elif voice_channel != voice_client.channel:
             await voice_client.move_to(voice_channel)
 
+        # Searches we've resolved before (and tracks picked from autocomplete) skip yt-dlp entirely.
+        search_index = self.music_cog.search_index
+        if song_query.startswith("http"):
+            known_track = search_index.get(song_query)
+        else:
+            known_track = search_index.lookup(song_query)
+        if known_track is not None:
+            original_query, title, duration = known_track.url, known_track.title, known_track.duration
+            search_index.record(song_query, original_query, title, duration)
+        else:
+            resolved = await self.search_song(interaction, song_query)
+            if resolved is None:
+                return
+            original_query, title, duration, track_url = resolved
+            if track_url and track_url.startswith("http"):
+                search_index.record(song_query, track_url, title, duration)
+
+        guild_id = str(interaction.guild_id)
+        track = Track(original_query, title, duration=duration, requester=interaction.user.id)
+
+        if voice_client.is_playing() or voice_client.is_paused():
+            self.music_cog.get_queue(guild_id).append(track)
+            self.music_cog.on_queue_changed(guild_id)
+            await interaction.followup.send(f"Added to queue: **{title}**")
+        else:
+            self.music_cog.get_queue(guild_id).append(track)
+            await self.music_cog.play_next_song(guild_id, interaction.channel)
+
+    async def search_song(self, interaction: discord.Interaction, song_query: str):
+        """Looks a query up with yt-dlp. Returns (query to queue, title, duration, video URL) or None after replying."""
         if not song_query.startswith("http"):
             song_query = f"ytsearch:{song_query}"
 
@@ -48,7 +109,9 @@ class AddSongs(commands.Cog):
             if results.get('_type') == 'playlist':
                 first_track = results['entries'][0]
                 title = first_track.get('title', "Untitled")
+                duration = first_track.get('duration')
                 original_query = results.get('webpage_url', song_query)
+                track_url = first_track.get('webpage_url') or first_track.get('url')
                 await interaction.followup.send(
                     f"**{title}** Added to the queue"
                 )
@@ -56,35 +119,30 @@ class AddSongs(commands.Cog):
             elif 'entries' in results:
                 first_track = results['entries'][0]
                 title = first_track.get('title', "Untitled")
+                duration = first_track.get('duration')
                 original_query = first_track.get('webpage_url', song_query)
+                track_url = first_track.get('webpage_url') or first_track.get('url')
 
             elif 'url' in results:
                 title = results.get('title', "Untitled")
+                duration = results.get('duration')
                 original_query = results.get('webpage_url', song_query)
+                track_url = results.get('webpage_url')
 
             else:
                 await interaction.followup.send("No results found.")
-                return
+                return None
 
             if not original_query:
                 await interaction.followup.send("Could not retrieve a playable URL for this song.")
-                return
+                return None
 
         except Exception as e:
             print(f"Error during yt_dlp extraction: {e}")
             await interaction.followup.send("An error occurred while searching for the song.")
-            return
+            return None
 
-        guild_id = str(interaction.guild_id)
-        if guild_id not in self.music_cog.song_queues:
-            self.music_cog.song_queues[guild_id] = deque()
-
-        if voice_client.is_playing() or voice_client.is_paused():
-            self.music_cog.song_queues[guild_id].append((original_query, title))
-            await interaction.followup.send(f"Added to queue: **{title}**")
-        else:
-            self.music_cog.song_queues[guild_id].append((original_query, title))
-            await self.music_cog.play_next_song(guild_id, interaction)
+        return original_query, title, duration, track_url
 
     @app_commands.command(name="playlist", description="Enqueue an entire playlist.")
     @app_commands.describe(playlist_url="The URL of the YouTube playlist")
@@ -97,47 +155,145 @@ class AddSongs(commands.Cog):
             return
         voice_channel = voice_channel.channel
 
+        guild_id = str(interaction.guild_id)
+        ingestions = self.music_cog.playlist_ingestions
+        if guild_id in ingestions:
+            await interaction.followup.send("A playlist is already loading for this server. Use `/cancelplaylist` to stop it first.")
+            return
+        # Hold the slot while the first page loads so a second /playlist can't slip in. It's a future so
+        # /cancelplaylist can cancel it like the background task that replaces it.
+        reservation = asyncio.get_running_loop().create_future()
+        ingestions[guild_id] = reservation
+        try:
+            await self.start_playlist(interaction, guild_id, voice_channel, playlist_url, reservation)
+        finally:
+            if ingestions.get(guild_id) is reservation:
+                del ingestions[guild_id]
+
+    async def start_playlist(self, interaction, guild_id, voice_channel, playlist_url, reservation):
         voice_client = interaction.guild.voice_client
         if voice_client is None:
             voice_client = await voice_channel.connect()
         elif voice_channel != voice_client.channel:
             await voice_client.move_to(voice_channel)
 
+        # Only the first page is fetched up front so playback can start right away.
+        try:
+            results = await self.music_cog.search_ytdlp_async(
+                playlist_url, playlist_page_opts(1, PLAYLIST_FIRST_PAGE), use_cache=False
+            )
+        except Exception as e:
+            print(f"Error during playlist extraction: {e}")
+            await interaction.followup.send("An error occurred while processing the playlist.")
+            return
 
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'extract_flat': 'in_playlist',  # Get all playlist entries
-            'noplaylist': False,  # Allow playlists.
-            'quiet': True,
-            'no_warnings': True,
-        }
+        if results.get('_type') != 'playlist':
+            await interaction.followup.send("This doesn't seem to be a valid playlist.")
+            return
+
+        entries = results.get('entries') or []
+        playlist_title = results.get('title', 'Untitled')
+        total = results.get('playlist_count')
+        added_count = self.enqueue_playlist_entries(guild_id, entries, playlist_url, interaction.user.id)
+
+        ingestions = self.music_cog.playlist_ingestions
+        more = len(entries) >= PLAYLIST_FIRST_PAGE and (total is None or total > PLAYLIST_FIRST_PAGE)
+        if more and ingestions.get(guild_id) is reservation:
+            progress_message = await interaction.followup.send(
+                f"Added {added_count} songs from the playlist '{playlist_title}' to the queue. Loading the rest...",
+                wait=True,
+            )
+            if ingestions.get(guild_id) is reservation:
+                ingestions[guild_id] = asyncio.create_task(
+                    self.ingest_remaining_playlist(
+                        guild_id, interaction, playlist_url, playlist_title, total, added_count, progress_message
+                    )
+                )
+            else:  # /cancelplaylist ran while the message was being sent.
+                await progress_message.edit(
+                    content=f"Added {added_count} songs from the playlist '{playlist_title}' to the queue."
+                )
+        else:
+            await interaction.followup.send(f"Added {added_count} songs from the playlist '{playlist_title}' to the queue.")
 
+        # Start playing if not already playing
+        if not voice_client.is_playing():
+            await self.music_cog.play_next_song(guild_id, interaction.channel)
+        else:
+            self.music_cog.on_queue_changed(guild_id)
+
+    def enqueue_playlist_entries(self, guild_id, entries, playlist_url, requester=None):
+        """Appends flat playlist entries to the guild's queue and returns how many were valid."""
+        tracks = [
+            Track(
+                entry.get('url', playlist_url),  # Use URL as original query
+                entry.get('title', 'Untitled'),
+                duration=entry.get('duration'),
+                requester=requester,
+            )
+            for entry in entries
+            if entry  # Check if entry is valid
+        ]
+        self.music_cog.get_queue(guild_id).extend(tracks)
+        return len(tracks)
+
+    async def ingest_remaining_playlist(self, guild_id, interaction, playlist_url, playlist_title, total,
+                                        added_count, progress_message):
+        """Loads the rest of a playlist page by page, growing the page size as it goes."""
+        start = PLAYLIST_FIRST_PAGE + 1
+        page_size = PLAYLIST_FIRST_PAGE * 5
+        status = None
         try:
-            results = await self.music_cog.search_ytdlp_async(playlist_url, ydl_opts)
+            while True:
+                end = start + page_size - 1
+                results = await self.music_cog.search_ytdlp_async(
+                    playlist_url, playlist_page_opts(start, end), use_cache=False, priority=PRIORITY_BACKGROUND
+                )
+                voice_client = interaction.guild.voice_client
+                if voice_client is None:
+                    status = f"Stopped loading '{playlist_title}' after {added_count} songs because playback ended."
+                    return
 
-            if results.get('_type') == 'playlist':
-                guild_id = str(interaction.guild_id)
-                if guild_id not in self.music_cog.song_queues:
-                    self.music_cog.song_queues[guild_id] = deque()
-
-                added_count = 0
-                for entry in results['entries']:
-                    if entry:  # Check if entry is valid
-                        title = entry.get('title', 'Untitled')
-                        original_query = entry.get('url', playlist_url)  # Use URL as original query
-                        self.music_cog.song_queues[guild_id].append((original_query, title))
-                        added_count += 1
-
-                await interaction.followup.send(f"Added {added_count} songs from the playlist '{results['title']}' to the queue.")
-                # Start playing if not already playing
-                if not voice_client.is_playing():
-                    await self.music_cog.play_next_song(guild_id, interaction)
+                entries = results.get('entries') or []
+                added_count += self.enqueue_playlist_entries(guild_id, entries, playlist_url, interaction.user.id)
+                self.music_cog.on_queue_changed(guild_id)
 
-            else:
-                await interaction.followup.send("This doesn't seem to be a valid playlist.")
+                if len(entries) < page_size or (total and end >= total):
+                    status = f"Added {added_count} songs from the playlist '{playlist_title}' to the queue."
+                    return
+
+                start = end + 1
+                page_size = min(page_size * 2, PLAYLIST_MAX_PAGE)
+                loaded = f"{added_count}/{total}" if total else str(added_count)
+                await self._edit_progress(
+                    progress_message, f"Loading '{playlist_title}'... {loaded} songs added to the queue so far."
+                )
+        except asyncio.CancelledError:
+            status = f"Stopped loading '{playlist_title}' after {added_count} songs."
+            raise
         except Exception as e:
             print(f"Error during playlist extraction: {e}")
-            await interaction.followup.send("An error occurred while processing the playlist.")
+            status = f"Stopped loading '{playlist_title}' after {added_count} songs because an error occurred."
+        finally:
+            if self.music_cog.playlist_ingestions.get(guild_id) is asyncio.current_task():
+                del self.music_cog.playlist_ingestions[guild_id]
+            if status:
+                # Shielded so the final status still lands when the load was cancelled.
+                await asyncio.shield(self._edit_progress(progress_message, status))
+
+    async def _edit_progress(self, message, content):
+        try:
+            await message.edit(content=content)
+        except discord.HTTPException as e:
+            # The interaction token only lives for 15 minutes; losing progress updates is fine.
+            print(f"Could not update playlist progress: {e}")
+
+    @app_commands.command(name="cancelplaylist", description="Stop loading a playlist that is still being added.")
+    async def cancel_playlist(self, interaction: discord.Interaction):
+        if self.music_cog.cancel_playlist_ingestion(str(interaction.guild_id)):
+            await interaction.response.send_message("Stopped loading the playlist. Songs already added stay in the queue.")
+        else:
+            await interaction.response.send_message("No playlist is being loaded right now.")
 
 async def setup(bot: commands.Bot, music_cog: 'MusicCog'):
     await bot.add_cog(AddSongs(bot, music_cog))
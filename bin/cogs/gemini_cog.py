@@ -1,15 +1,24 @@
 import os
+import asyncio
 import discord
 from discord.ext import commands
-import google.generativeai as genai
-import requests
-import base64
+from discord import app_commands
 import random
 import traceback
 import logging
+import math
 from typing import List
-import filetype
-import datetime
+
+from bin.utils.config_service import ConfigService
+from bin.utils.fair_scheduler import REASON_RATE_LIMITED, FairScheduler, SchedulerBusy
+from bin.utils.gemini_client import GeminiClient, GeminiTimeout
+from bin.utils.history_cache import HistoryCache
+from bin.utils.image_fetcher import ImageFetcher, ImageFetchError
+from bin.utils.lazy_import import lazy_import
+from bin.utils.member_index import MemberIndex
+from bin.utils.prompt_builder import ConversationSummaries, build_prompt, format_turn
+from bin.utils.response_cache import ResponseCache
+from bin.utils.streaming_reply import StreamingReply
 
 # Initialize logging
 logger = logging.getLogger(__name__)
@@ -17,27 +26,263 @@ logger.setLevel(logging.INFO)
 handler = logging.StreamHandler()
 handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
 logger.addHandler(handler)
+
+# The SDK pulls in grpc and protobuf; it's imported when the first request needs it (or by the warm-up).
+genai = lazy_import("google.generativeai")
+
+# Mentions arriving in the same channel within this many seconds get one combined reply.
+COALESCE_WINDOW = float(os.getenv("GEMINI_COALESCE_WINDOW", "1.5"))
+# A steady stream of mentions still gets answered at least this often.
+COALESCE_MAX_DELAY = 5.0
+# Post a placeholder and edit it as Gemini generates, instead of sending the finished reply.
+STREAMING = os.getenv("GEMINI_STREAMING", "0").lower() in ("1", "true", "yes")
+# Opt-in: reuse replies to repeated questions. Guilds can still opt out with /geminicache.
+RESPONSE_CACHE = os.getenv("GEMINI_RESPONSE_CACHE", "0").lower() in ("1", "true", "yes")
+# Estimated tokens (characters / 4) the prompt may use; older turns beyond it are summarized.
+PROMPT_TOKEN_BUDGET = int(os.getenv("GEMINI_PROMPT_TOKENS", "1500"))
+
+
+class MentionBatch:
+    __slots__ = ('latest', 'started', 'count', 'result')
+
+    def __init__(self, loop):
+        self.latest = None
+        self.started = loop.time()
+        self.count = 0
+        self.result = loop.create_future()
+
+
+def parse_guild_weights(value: str) -> dict:
+    """Parses "guild_id:weight,guild_id:weight" into {guild_id: weight}."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        try:
+            guild_id, weight = item.split(":")
+            weight = float(weight)
+            if not (math.isfinite(weight) and weight > 0):
+                raise ValueError
+            weights[int(guild_id)] = weight
+        except ValueError:
+            print(f"Ignoring invalid GEMINI_GUILD_WEIGHTS entry: {item!r}")
+    return weights
+
+
 class GeminiCog(commands.Cog):
-    def __init__(self, bot: commands.Bot):
+    def __init__(self, bot: commands.Bot, config: ConfigService):
         self.bot = bot
+        self.config = config
         self.GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
         if not self.GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY environment variable not set.")
-        genai.configure(api_key=self.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        max_concurrent = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+        self.scheduler = FairScheduler(
+            max_concurrent=max_concurrent,
+            max_queue=int(os.getenv("GEMINI_MAX_QUEUE", "50")),
+            rate=float(os.getenv("GEMINI_GUILD_RATE_PER_MINUTE", "20")) / 60,
+            burst=int(os.getenv("GEMINI_GUILD_BURST", "5")),
+            weights=parse_guild_weights(os.getenv("GEMINI_GUILD_WEIGHTS", "")),
+        )
+        self.client = GeminiClient(
+            self.create_model,
+            max_concurrent=max_concurrent,
+            per_guild=int(os.getenv("GEMINI_GUILD_CONCURRENCY", "2")),
+            timeout=float(os.getenv("GEMINI_TIMEOUT", "30")),
+            scheduler=self.scheduler,
+        )
+        self.image_fetcher = ImageFetcher(
+            max_bytes=int(os.getenv("GEMINI_IMAGE_MAX_MB", "8")) * 1024 * 1024,
+            max_dimension=int(os.getenv("GEMINI_IMAGE_MAX_DIMENSION", "1536")),
+        )
+        self.history_cache = HistoryCache(
+            self.history_turn,
+            maxlen=int(os.getenv("GEMINI_HISTORY_TURNS", "20")),
+            idle_ttl=float(os.getenv("GEMINI_HISTORY_IDLE_SECONDS", "1800")),
+        )
+        self.member_index = MemberIndex()
+        self.response_cache = ResponseCache(
+            ttl=float(os.getenv("GEMINI_RESPONSE_CACHE_TTL", "3600")),
+            context_turns=int(os.getenv("GEMINI_RESPONSE_CACHE_CONTEXT", "2")),
+        ) if RESPONSE_CACHE else None
+        self.summaries = ConversationSummaries(self.client)
+        self.mention_batches = {}  # channel_id -> MentionBatch
+        self.coalesced_mentions = 0
         print("Gemini Cog Initialized")
 
+    def response_cache_for(self, guild: discord.Guild):
+        """The response cache, unless it's disabled globally or bypassed by this guild."""
+        if self.response_cache is None:
+            return None
+        if guild and self.config.get(guild.id, "gemini", "response_cache") is False:
+            return None
+        return self.response_cache
+
+    def create_model(self):
+        """Runs on a worker thread the first time Gemini is needed."""
+        genai.configure(api_key=self.GEMINI_API_KEY)
+        return genai.GenerativeModel('gemini-2.0-flash')
+
+    async def cog_unload(self):
+        await self.image_fetcher.close()
+
+    @app_commands.command(name="geminicache", description="Turn reuse of cached Gemini replies on or off for this server.")
+    @app_commands.describe(enabled="Whether repeated questions may be answered from the cache.")
+    async def geminicache(self, interaction: discord.Interaction, enabled: bool):
+        if not interaction.guild:
+            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+            return
+        if not interaction.user.guild_permissions.manage_guild:
+            await interaction.response.send_message("You need 'Manage Server' permissions to use this command.", ephemeral=True)
+            return
+
+        self.config.set(interaction.guild.id, "gemini", "response_cache", enabled)
+        note = "" if self.response_cache is not None else " (the response cache is currently disabled for the whole bot)"
+        await interaction.response.send_message(
+            f"Cached Gemini replies are now {'enabled' if enabled else 'bypassed'} for this server{note}.", ephemeral=True
+        )
+
+    @app_commands.command(name="geministats", description="Show Gemini request, cache and history statistics.")
+    @app_commands.default_permissions(manage_guild=True)
+    async def geministats(self, interaction: discord.Interaction):
+        if not interaction.guild:
+            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+            return
+        if not interaction.user.guild_permissions.manage_guild:
+            await interaction.response.send_message("You need 'Manage Server' permissions to use this command.", ephemeral=True)
+            return
+        client = self.client.stats()
+        message = (
+            f"**Gemini**\n"
+            f"Requests: {client['requests']} | In flight: {client['in_flight']} | "
+            f"Timeouts: {client['timeouts']} | Errors: {client['errors']}\n"
+            f"Avg latency: {client['avg_latency']:.2f}s | Avg first chunk: {client['avg_first_chunk']:.2f}s | "
+            f"Coalesced mentions: {self.coalesced_mentions}"
+        )
+        scheduler = self.scheduler.stats()
+        message += (
+            f"\n**Scheduler**\n"
+            f"Waiting: {scheduler['waiting']} | Admitted: {scheduler['admitted']} | "
+            f"Avg wait: {scheduler['avg_wait']:.2f}s | Max wait: {scheduler['max_wait']:.2f}s\n"
+            f"Refused (rate limit): {scheduler['rate_limited']} | Refused (queue full): {scheduler['dropped']}"
+        )
+        if self.response_cache is not None:
+            cache = self.response_cache.stats()
+            message += (
+                f"\n**Response cache**\n"
+                f"Entries: {cache['size']}/{cache['maxsize']} | Hit ratio: {cache['hit_ratio']:.0%} | "
+                f"API calls saved: {cache['api_calls_saved']}"
+            )
+        history = self.history_cache.stats()
+        summaries = self.summaries.stats()
+        images = self.image_fetcher.stats()
+        message += (
+            f"\n**History cache**\n"
+            f"Channels: {history['channels']} | Served from cache: {history['hits']} | Cold fetches: {history['cold_fetches']} | "
+            f"Summaries: {summaries['channels']} ({summaries['refreshes']} refreshes)\n"
+            f"**Images**\n"
+            f"Cached: {images['cached']} | Hits: {images['hits']} | Downloads: {images['misses']}"
+        )
+        await interaction.response.send_message(message, ephemeral=True)
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
+        self.history_cache.add(message)
         if message.author == self.bot.user:
             return
 
         if isinstance(message.channel, discord.DMChannel) or self.bot.user.mentioned_in(message):
+            await self.coalesce_message(message)
+
+    @commands.Cog.listener()
+    async def on_message_edit(self, before: discord.Message, after: discord.Message):
+        self.history_cache.edit(after)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        # The raw event also fires for messages that fell out of discord.py's message cache.
+        self.history_cache.delete(payload.channel_id, payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        self.member_index.add(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        self.member_index.remove(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        self.member_index.rename(before, after)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        self.member_index.rename(before, after)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.member_index.forget(guild.id)
+
+    def history_turn(self, msg: discord.Message) -> dict:
+        """Turns a message into a prompt history entry, resolving mentions to names."""
+        msg_content = msg.content
+        mentioned_by = []
+        for mention in msg.mentions:
+            msg_content = msg_content.replace(f"<@{mention.id}>", f"@{mention.name}")
+            mentioned_by.append(msg.author.name)
+        for role_mention in msg.role_mentions:
+            msg_content = msg_content.replace(f"<@&{role_mention.id}>", f"@{role_mention.name}")
+        for channel_mention in msg.channel_mentions:
+            msg_content = msg_content.replace(f"<#{channel_mention.id}>", f"#{channel_mention.name}")
+        for mentioning_user in mentioned_by:
+            msg_content += f" (Mentioned by {mentioning_user})"
+
+        image_url_in_msg = None
+        for attachment in msg.attachments:
+            if attachment.content_type and attachment.content_type.startswith('image/'):
+                image_url_in_msg = attachment.url
+                break
+
+        turn = {
+            'text': msg_content,
+            'image_url': image_url_in_msg,
+            'author': msg.author.name,
+            'timestamp': msg.created_at,
+        }
+        format_turn(turn)  # Render the prompt line now rather than on every mention.
+        return turn
+
+    async def coalesce_message(self, message: discord.Message):
+        """Answers only the newest of a burst of mentions in a channel.
+
+        The earlier mentions are already part of the channel history the newest
+        one is answered with, so a single Gemini request covers all of them.
+        """
+        loop = asyncio.get_running_loop()
+        batch = self.mention_batches.get(message.channel.id)
+        if batch is None:
+            batch = self.mention_batches[message.channel.id] = MentionBatch(loop)
+        batch.latest = message
+        batch.count += 1
+
+        delay = min(COALESCE_WINDOW, batch.started + COALESCE_MAX_DELAY - loop.time())
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if batch.latest is not message:
+            # A newer mention is answering for this one; share its outcome.
+            self.coalesced_mentions += 1
+            await asyncio.shield(batch.result)
+            return
+
+        if self.mention_batches.get(message.channel.id) is batch:
+            del self.mention_batches[message.channel.id]
+        try:
             await self.process_message(message)
+        finally:
+            batch.result.set_result(None)
 
     async def process_message(self, message: discord.Message):
         """Processes a message."""
         image_url = None
+        images = []
         mentions_data = {}
 
         try:
@@ -46,6 +291,7 @@ class GeminiCog(commands.Cog):
                 for attachment in message.attachments:
                     if attachment.content_type and attachment.content_type.startswith('image/'):
                         image_url = attachment.url
+                        images.append((attachment.id, attachment.url))
 
             if self.bot.user.mentioned_in(message):
                 user_input = message.content.replace(f'<@{self.bot.user.id}>', '').strip()
@@ -53,34 +299,8 @@ class GeminiCog(commands.Cog):
             else:
                 user_input = message.content.strip()
 
-            recent_messages = []
             try:
-                async for msg in message.channel.history(limit=20, before=message):
-                    msg_content = msg.content
-                    for mention in msg.mentions:
-                        msg_content = msg_content.replace(f"<@{mention.id}>", f"@{mention.name}")
-                        mentions_data[mention.id] = msg.author.name
-                    for role_mention in msg.role_mentions:
-                        msg_content = msg_content.replace(f"<@&{role_mention.id}>", f"@{role_mention.name}")
-                    for channel_mention in msg.channel_mentions:
-                        msg_content = msg_content.replace(f"<#{channel_mention.id}>", f"#{channel_mention.name}")
-
-                    image_url_in_msg = None
-                    for attachment in msg.attachments:
-                        if attachment.content_type and attachment.content_type.startswith('image/'):
-                            image_url_in_msg = attachment.url
-                            break
-
-                    msg_data = {
-                        'text': msg_content,
-                        'image_url': image_url_in_msg,
-                        'author': msg.author.name,
-                        'timestamp': msg.created_at,
-                        'mentions': mentions_data.copy()
-                    }
-                    recent_messages.append(msg_data)
-                    mentions_data.clear()
-
+                history_for_prompt = await self.history_cache.before(message)
             except discord.errors.Forbidden:
                 logger.error("Missing permissions to read message history.")
                 await message.channel.send("I don't have permission to read message history in this channel.")
@@ -90,53 +310,32 @@ class GeminiCog(commands.Cog):
                 await message.channel.send("An error occurred while fetching message history.")
                 return
 
-            recent_messages.reverse()
-
-            current_message_data = {
-                'text': user_input,
+            current_text = user_input
+            for mentioning_user in mentions_data.values():
+                current_text += f" (Mentioned by {mentioning_user})"
+            history_for_prompt.append({
+                'text': current_text,
                 'image_url': image_url,
                 'author': message.author.name,
                 'timestamp': message.created_at,
-                'mentions': mentions_data.copy()
-            }
-            recent_messages.append(current_message_data)
-
-            if len(recent_messages) > 50:
-                recent_messages = recent_messages[-50:]
-
-            history_for_prompt = []
-            for msg in recent_messages:
-                msg_text = msg['text']
-                if msg['mentions']:
-                    for _, mentioning_user in msg['mentions'].items():
-                        msg_text += f" (Mentioned by {mentioning_user})"
-                history_for_prompt.append({
-                    'text': msg_text,
-                    'image_url': msg.get('image_url'),
-                    'author': msg['author'],
-                    'timestamp': msg['timestamp']
-                })
-
-            response = await get_response(user_input, self.model, image_url=image_url, history=history_for_prompt)
+            })
+
+            if STREAMING:
+                await self.stream_reply(message, user_input, images, history_for_prompt)
+                return
+
+            async with message.channel.typing():
+                response = await self.get_response(message, user_input, images, history_for_prompt)
 
             if response:
                 # --- Mention Handling (Corrected for DMs) ---
                 response_with_mentions = response
                 if message.guild:  # Check if it's in a guild (not a DM)
-                    for member in message.guild.members:
-                        response_with_mentions = response_with_mentions.replace(f"@{member.name}", f"<@{member.id}>")
+                    response_with_mentions = self.member_index.rewrite(message.guild, response)
 
+                # The reply reaches the history cache through on_message.
                 await message.channel.send(response_with_mentions)
 
-                bot_response_data = {
-                    'text': response,
-                    'image_url': None,
-                    'author': self.bot.user.name,
-                    'timestamp': datetime.datetime.now(datetime.timezone.utc),
-                    'mentions': {}
-                }
-                recent_messages.append(bot_response_data)
-
             else:
                 await message.channel.send("Sorry, I couldn't generate a response.")
 
@@ -145,7 +344,30 @@ class GeminiCog(commands.Cog):
             traceback.print_exc()
             await message.channel.send("Oops! Something went wrong...")
 
-async def get_response(user_input: str, model, image_url=None, history=None) -> str:
+    async def stream_reply(self, message: discord.Message, user_input: str, images, history_for_prompt):
+        """Answers with a placeholder that is edited as Gemini streams the response."""
+        transform = None
+        if message.guild:
+            transform = lambda text: self.member_index.rewrite(message.guild, text)
+        reply = StreamingReply(message.channel, transform=transform)
+        await reply.start()
+
+        response = await self.get_response(message, user_input, images, history_for_prompt, on_chunk=reply.update)
+        await reply.finish(response or "Sorry, I couldn't generate a response.")
+
+    async def get_response(self, message: discord.Message, user_input: str, images, history_for_prompt, on_chunk=None):
+        # Each DM gets its own share of the rate limits instead of all DMs sharing one.
+        guild_id = message.guild.id if message.guild else f"dm:{message.channel.id}"
+        return await get_response(
+            user_input, self.client, images=images, history=history_for_prompt,
+            guild_id=guild_id, image_fetcher=self.image_fetcher,
+            on_chunk=on_chunk, response_cache=self.response_cache_for(message.guild),
+            summaries=self.summaries, channel_id=message.channel.id,
+        )
+
+async def get_response(user_input: str, client: GeminiClient, images=None, history=None, guild_id=None,
+                       image_fetcher: ImageFetcher = None, on_chunk=None, response_cache: ResponseCache = None,
+                       summaries: ConversationSummaries = None, channel_id=None) -> str:
     """Gets AI response."""
     logger.info("Entering get_response function")
     lowered: str = user_input.lower()
@@ -163,69 +385,91 @@ async def get_response(user_input: str, model, image_url=None, history=None) ->
         chosen_persona = random.choice(personas)
         prompt_instructions = "Respond to the following user input concisely.  Consider all parts of the conversation history equally."
 
-        full_prompt_content = ""
-        if history:
-            full_prompt_content += "Conversation History:\n"
-            for turn in history:
-                timestamp_str = turn['timestamp'].strftime("%Y-%m-%d %H:%M:%S UTC")
-                role_prefix = f"{turn['author']} ({timestamp_str}):"
-                content_text = turn['text']
-                turn_image_url = turn.get('image_url')
-
-                if turn_image_url:
-                    full_prompt_content += f"{role_prefix} [Image Attached] {content_text}\n"
-                else:
-                    full_prompt_content += f"{role_prefix} {content_text}\n"
-            full_prompt_content += "\n"
-
-        full_prompt_content += f"{chosen_persona} {prompt_instructions} User input: '{user_input}'"
-        if image_url:
-            full_prompt_content += f"\n\nThere is an image attached to this message. Please analyze the image and incorporate your analysis into your response."
-            logger.info(f"Image instruction added to prompt: {full_prompt_content}")
-
-        return await generate_gemini_response(full_prompt_content, model, image_url)
+        summary = summaries.get(channel_id) if summaries is not None else None
+        full_prompt_content, omitted = build_prompt(
+            history, chosen_persona, prompt_instructions, user_input,
+            has_images=bool(images), budget=PROMPT_TOKEN_BUDGET, summary=summary,
+        )
+        if omitted and summaries is not None:
+            summaries.schedule_refresh(
+                channel_id, omitted,
+                generation_config={"max_output_tokens": summaries.max_output_tokens},
+            )
+
+        # The current message is the last history turn; the cache key only looks at the turns before it.
+        cache_context = (user_input, (history or [])[:-1])
+        return await generate_gemini_response(
+            full_prompt_content, client, images, guild_id=guild_id, image_fetcher=image_fetcher, on_chunk=on_chunk,
+            response_cache=response_cache, cache_context=cache_context,
+        )
     pass
 
-async def generate_gemini_response(prompt: str, model, image_url: str = None) -> str:
-    """Generates response from Gemini API."""
+async def generate_gemini_response(prompt: str, client: GeminiClient, images=None, guild_id=None,
+                                   image_fetcher: ImageFetcher = None, on_chunk=None,
+                                   response_cache: ResponseCache = None, cache_context=None) -> str:
+    """Generates response from Gemini API. `images` are (attachment_id, url) pairs.
+
+    With `on_chunk`, the response is streamed and `on_chunk(text_so_far)` is awaited as it grows.
+    With `response_cache`, `cache_context` is (user_input, history) for the cache key.
+    """
     logger.info("Entering generate_gemini_response function")
-    logger.info(f"Prompt to Gemini: {prompt}, Image URL: {image_url}")
+    logger.info(f"Prompt to Gemini: {prompt}, Images: {len(images or [])}")
 
     content_parts: List[dict] = []
     content_parts.append({"text": prompt})
 
-    if image_url:
+    image_digests = []
+    if images:
         try:
-            logger.info(f"Fetching image from URL: {image_url}")
-            image_response = requests.get(image_url, stream=True)
-            image_response.raise_for_status()
-            image_data = image_response.content
-            kind = filetype.guess(image_data)
-            if kind is None:
-                logger.warning("Could not determine image type. Defaulting to png.")
-                mime_type = "image/png"
-            else:
-                mime_type = kind.mime
-
-            content_parts.append({"inline_data": {"mime_type": mime_type, "data": base64.b64encode(image_data).decode()}})
-            logger.info(f"Image fetched and added to content parts (type: {mime_type}).")
-        except requests.exceptions.RequestException as e:
+            logger.info(f"Fetching {len(images)} image(s)")
+            for image in await image_fetcher.fetch_many(images):
+                content_parts.append(image.as_part())
+                image_digests.append(image.digest)
+            logger.info("Images fetched and added to content parts.")
+        except ImageFetchError as e:
             logger.error(f"Error fetching image: {e}")
             return "I couldn't download the image. Please check the link."
         except Exception as e:
             logger.exception(f"Unexpected error fetching/processing image: {e}")
             return "An unexpected error occurred while processing the image."
 
+    cache_key = None
+    if response_cache is not None and cache_context is not None:
+        user_input, context = cache_context
+        cache_key = response_cache.make_key(user_input, image_digests, context)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Answering from the response cache.")
+            return cached
+
     try:
         logger.info("Sending request to Gemini API...")
-        response = model.generate_content(contents=content_parts, generation_config=genai.types.GenerationConfig(max_output_tokens=200))
-        return response.text
+        generation_config = {"max_output_tokens": 200}
+        if on_chunk is None:
+            response = await client.generate(content_parts, guild_id=guild_id, generation_config=generation_config)
+            text = response.text
+        else:
+            text = ""
+            async for chunk in client.stream(content_parts, guild_id=guild_id, generation_config=generation_config):
+                text += chunk
+                await on_chunk(text)
+        if cache_key is not None and text:
+            response_cache.set(cache_key, text)
+        return text
+    except SchedulerBusy as e:
+        logger.info(f"Gemini request refused by the scheduler: {e.reason}")
+        if e.reason == REASON_RATE_LIMITED:
+            return "This server is asking me a lot right now. Give me a minute and try again."
+        return "I'm handling a lot of requests right now. Please try again in a moment."
+    except GeminiTimeout as e:
+        logger.warning(f"Gemini request timed out: {e}")
+        return "Gemini is taking too long to answer right now. Try again in a moment."
     except Exception as e:
         logger.error(f"Error with Gemini API: {e}", exc_info=True)
         return "I'm having trouble with Gemini right now. Try again later."
         pass
 
-async def setup(bot: commands.Bot):
+async def setup(bot: commands.Bot, config: ConfigService):
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     if not GEMINI_API_KEY:
         print("GEMINI_API_KEY not found in environment variables. Gemini Cog will not be loaded.")
@@ -233,7 +477,7 @@ async def setup(bot: commands.Bot):
 
     try:
         # Only initialize and add the cog if the API key is present
-        await bot.add_cog(GeminiCog(bot))
+        await bot.add_cog(GeminiCog(bot, config))
         print("Gemini Cog loaded!")
     except ValueError as e:
         print(f"Gemini Cog could not be loaded: {e}") # Catch the ValueError from GeminiCog init if it still occurs after checking above
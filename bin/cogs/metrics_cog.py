@@ -0,0 +1,156 @@
+import asyncio
+import functools
+import time
+
+import discord
+from discord.ext import commands
+
+from bin.utils import metrics
+from bin.utils.audio_sources import ffmpeg_process_count
+from bin.utils.metrics import MetricsServer
+
+LOOP_LAG_INTERVAL = 0.5  # seconds between event-loop lag probes
+RESPONSE_METHODS = ("defer", "send_message", "send_modal")  # the ways a command can first answer
+
+INTERACTION_SECONDS = metrics.histogram(
+    "discord_interaction_response_seconds",
+    "Time from receiving a slash command until its first response (a reply or a defer).",
+    labels=("command",),
+)
+INTERACTIONS_UNANSWERED = metrics.counter(
+    "discord_interactions_unanswered_total", "Slash commands that finished without answering Discord in time.",
+    labels=("command",),
+)
+COMMANDS = metrics.counter(
+    "discord_app_commands_total", "Slash commands run, by outcome (ok or error).", labels=("command", "outcome"),
+)
+LOOP_LAG_SECONDS = metrics.histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a sleeping task.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+
+class MetricsCog(commands.Cog):
+    """Serves the bot's metrics for Prometheus on a local port, and measures the ones no other cog owns."""
+
+    def __init__(self, bot: commands.Bot, host="127.0.0.1", port=9464):
+        self.bot = bot
+        self.server = MetricsServer(host=host, port=port)
+        self._lag_task = None
+        self._response_methods = {}  # InteractionResponse method name -> the original, while wrapped
+        self._tree_on_error = None
+        self._tree_interaction_check = None
+        self.last_loop_lag = 0.0
+
+        metrics.gauge("event_loop_lag_last_seconds", "The most recent event-loop lag probe.",
+                      callback=lambda: self.last_loop_lag)
+        metrics.gauge("discord_gateway_latency_seconds", "Heartbeat latency per shard.", labels=("shard",),
+                      callback=self._gateway_latencies)
+        metrics.gauge("music_voice_connections", "Voice channels the bot is connected to.",
+                      callback=lambda: len(self.bot.voice_clients))
+        metrics.gauge("music_ffmpeg_processes", "ffmpeg processes spawned for playback and not yet cleaned up.",
+                      callback=ffmpeg_process_count)
+        metrics.gauge("music_queue_depth", "Tracks waiting in each guild's queue.", labels=("guild",),
+                      callback=self._queue_depths)
+        metrics.gauge("music_ytdlp_queue_depth", "yt-dlp jobs waiting for a worker.",
+                      callback=lambda: self._music_stat(lambda music: music.extraction_pool.queue_depth))
+        metrics.gauge("gemini_in_flight", "Gemini requests currently running.",
+                      callback=lambda: self._gemini_stat(lambda gemini: gemini.client.in_flight))
+        metrics.gauge("gemini_scheduler_waiting", "Gemini requests waiting for admission.",
+                      callback=lambda: self._gemini_stat(lambda gemini: gemini.scheduler.stats()["waiting"]))
+
+    def _music_stat(self, read):
+        music = self.bot.get_cog("MusicCog")
+        return read(music) if music is not None else 0
+
+    def _gemini_stat(self, read):
+        gemini = self.bot.get_cog("GeminiCog")
+        return read(gemini) if gemini is not None else 0
+
+    def _queue_depths(self):
+        music = self.bot.get_cog("MusicCog")
+        if music is None:
+            return {}
+        return {(guild_id,): len(queue) for guild_id, queue in music.song_queues.items()}
+
+    def _gateway_latencies(self):
+        latencies = getattr(self.bot, "latencies", None) or [(self.bot.shard_id or 0, self.bot.latency)]
+        return {(shard_id,): latency for shard_id, latency in latencies}
+
+    async def cog_load(self):
+        try:
+            await self.server.start()
+        except OSError as e:
+            print(f"Could not serve metrics on {self.server.host}:{self.server.port}: {e}")
+        else:
+            print(f"Serving metrics on http://{self.server.host}:{self.server.port}/metrics")
+        self._lag_task = asyncio.create_task(self._measure_loop_lag())
+        # Failed commands never reach on_app_command_completion, so count them from the tree's error hook.
+        self._tree_on_error = self.bot.tree.on_error
+        self.bot.tree.on_error = self._on_tree_error
+        # The tree's check runs in the command's own task before the callback: our clock starts there,
+        # and the first successful response call stops it.
+        self._tree_interaction_check = self.bot.tree.interaction_check
+        self.bot.tree.interaction_check = self._on_tree_interaction_check
+        for name in RESPONSE_METHODS:
+            original = self._response_methods[name] = getattr(discord.InteractionResponse, name)
+            setattr(discord.InteractionResponse, name, self._timed_response(original))
+
+    async def cog_unload(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        if self._tree_on_error is not None:
+            self.bot.tree.on_error = self._tree_on_error
+        if self._tree_interaction_check is not None:
+            self.bot.tree.interaction_check = self._tree_interaction_check
+        for name, original in self._response_methods.items():
+            setattr(discord.InteractionResponse, name, original)
+        self._response_methods.clear()
+        await self.server.close()
+
+    async def _measure_loop_lag(self):
+        while True:
+            expected = time.monotonic() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.last_loop_lag = max(0.0, time.monotonic() - expected)
+            LOOP_LAG_SECONDS.observe(self.last_loop_lag)
+
+    @staticmethod
+    def _command_name(interaction: discord.Interaction):
+        if interaction.command is not None:
+            return interaction.command.qualified_name
+        return (interaction.data or {}).get("name", "unknown")
+
+    async def _on_tree_interaction_check(self, interaction: discord.Interaction):
+        if interaction.type is discord.InteractionType.application_command:
+            # Our own clock, not Discord's created_at, so clock skew doesn't enter into it.
+            interaction.extras["metrics_received_at"] = time.monotonic()
+        return await self._tree_interaction_check(interaction)
+
+    def _timed_response(self, original):
+        @functools.wraps(original)
+        async def respond(response, *args, **kwargs):
+            result = await original(response, *args, **kwargs)
+            interaction = response._parent
+            received = interaction.extras.pop("metrics_received_at", None)
+            if received is not None:
+                INTERACTION_SECONDS.observe(time.monotonic() - received, command=self._command_name(interaction))
+            return result
+        return respond
+
+    def _finished(self, interaction: discord.Interaction, outcome):
+        COMMANDS.inc(command=self._command_name(interaction), outcome=outcome)
+        if interaction.extras.pop("metrics_received_at", None) is not None:
+            INTERACTIONS_UNANSWERED.inc(command=self._command_name(interaction))
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        self._finished(interaction, "ok")
+
+    async def _on_tree_error(self, interaction: discord.Interaction, error):
+        self._finished(interaction, "error")
+        await self._tree_on_error(interaction, error)
+
+
+async def setup(bot: commands.Bot, host="127.0.0.1", port=9464):
+    await bot.add_cog(MetricsCog(bot, host, port))
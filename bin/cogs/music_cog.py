@@ -1,135 +1,541 @@
 import discord
 from discord.ext import commands
-from collections import deque
-import yt_dlp
 import asyncio
-import functools
+import os
+from collections import deque
+
+from bin.utils.cluster import owns_guild
+from bin.utils.audio_cache import AudioCache
+from bin.utils.audio_sources import (PLAYBACK_OPUS, PLAYBACK_PCM, ResolvedStream, TrackedSource, create_audio_source,
+                                     youtube_video_id)
+from bin.utils.related_graph import RelatedGraph
+from bin.utils.search_index import SearchIndex
+from bin.utils.extraction_pool import ExtractionPool, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+from bin.utils.resolution_cache import ResolutionCache
+from bin.utils.state_store import StateStore
+from bin.utils.track_queue import Track, TrackQueue
+
+# Opus streams are only passed through untouched at 1.0 (100%); at any other volume ffmpeg re-encodes
+# them through its volume filter. Set MUSIC_DEFAULT_VOLUME=1.0 to get passthrough without /volume.
+DEFAULT_VOLUME = float(os.getenv("MUSIC_DEFAULT_VOLUME", "0.05"))
+POSITION_CHECKPOINT_INTERVAL = 10  # Seconds between saves of the playback position
+AUTOPLAY_SONGS = 3
+RECENTLY_PLAYED_WINDOW = 50  # Autoplay won't pick any of a guild's last this-many songs
+
+# Options used to turn a queued query into a playable stream URL.
+# Opus is preferred so opus playback mode can pass packets through untouched.
+STREAM_YDL_OPTS = {
+    'format': 'bestaudio[acodec=opus]/bestaudio/best',
+    'quiet': True,
+    'no_warnings': True,
+    'noplaylist': True,
+    'default_search': 'ytsearch',
+}
+
+# Options used to list a track's related videos for autoplay.
+RELATED_YDL_OPTS = {
+    'format': 'bestaudio/best',
+    'quiet': True,
+    'no_warnings': True,
+    'noplaylist': True,
+    'default_search': 'ytsearch',
+    'extract_flat': 'in_playlist'
+}
+
+
+class PreparedTrack:
+    """Lookahead state for the next queued song: resolving it into `track.stream`, optionally a running ffmpeg."""
+    __slots__ = ('track', 'source', 'task')
+
+    def __init__(self, track):
+        self.track = track
+        self.source = None
+        self.task = None
+
+    def discard(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+        if self.source is not None:
+            self.source.cleanup()
+            self.source = None
+
 
 class MusicCog(commands.Cog):
+    # Shared by every MusicCog instance so all guilds benefit from each other's lookups.
+    resolution_cache = ResolutionCache()
+    # Dedicated pool so extractions don't compete with the loop's default executor.
+    extraction_pool = ExtractionPool(
+        mode=os.getenv("YTDLP_EXECUTOR_MODE", "thread"),
+        max_workers=int(os.getenv("YTDLP_MAX_WORKERS", "4")),
+    )
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.song_queues = {}
+        self.song_queues = {}  # guild_id -> TrackQueue
         self.play_delay = 0
         self.volumes = {}
+        self.now_playing = {}  # guild_id -> Track currently playing
+        self.text_channels = {}  # guild_id -> ID of the channel "Now playing" messages go to
+        self._pending_extractions = {}  # cache key -> Future, so identical misses share one extraction
+        self.prepared_tracks = {}  # guild_id -> PreparedTrack for the head of the queue
+        self.playlist_ingestions = {}  # guild_id -> Task loading the rest of a /playlist in the background
+        # Spawning ffmpeg early removes the gap between songs at the cost of one idle process per guild.
+        self.prebuffer_audio = os.getenv("MUSIC_PREBUFFER_AUDIO", "false").lower() == "true"
+        self.playback_mode = os.getenv("MUSIC_PLAYBACK_MODE", PLAYBACK_OPUS).lower()
+        if self.playback_mode not in (PLAYBACK_OPUS, PLAYBACK_PCM):
+            print(f"Unknown MUSIC_PLAYBACK_MODE '{self.playback_mode}', falling back to PCM.")
+            self.playback_mode = PLAYBACK_PCM
+        self.state_store = StateStore(
+            os.getenv("MUSIC_STATE_DB", "music_state.db"),
+            guild_snapshot=self._guild_snapshot,
+            queue_snapshot=self._queue_snapshot,
+        )
+        self._checkpoint_task = None
+        self.related_graph = RelatedGraph(self.state_store)
+        self.search_index = SearchIndex(self.state_store)
+        self.recently_played = {}  # guild_id -> deque of recent video IDs
+        # Optional local copies of frequently played tracks; disabled unless a directory is configured.
+        cache_dir = os.getenv("MUSIC_AUDIO_CACHE_DIR")
+        self.audio_cache = AudioCache(
+            cache_dir,
+            max_bytes=int(os.getenv("MUSIC_AUDIO_CACHE_MAX_MB", "2048")) * 1024 * 1024,
+            min_plays=int(os.getenv("MUSIC_AUDIO_CACHE_MIN_PLAYS", "3")),
+            policy=os.getenv("MUSIC_AUDIO_CACHE_POLICY", "lru").lower(),
+        ) if cache_dir else None
+        self._restored = False
+        self._resume_limit = asyncio.Semaphore(5)  # Voice connects per batch when resuming after a restart
         super().__init__()
 
-    async def search_ytdlp_async(self, query, ydl_opts):
-        loop = asyncio.get_running_loop()
-        func = functools.partial(self._extract, query, ydl_opts)
-        return await loop.run_in_executor(None, func)
+    async def search_ytdlp_async(self, query, ydl_opts, use_cache=True, priority=PRIORITY_INTERACTIVE):
+        if not use_cache:
+            return await self.extraction_pool.extract(query, ydl_opts, priority=priority)
+
+        cached = self.resolution_cache.get(query, ydl_opts)
+        if cached is not None:
+            return cached
+
+        key = self.resolution_cache.make_key(query, ydl_opts)
+        pending = self._pending_extractions.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
 
-    def _extract(self, query, ydl_opts):
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            results = ydl.extract_info(query, download=False)
+        future = asyncio.get_running_loop().create_future()
+        self._pending_extractions[key] = future
+        try:
+            results = await self.extraction_pool.extract(query, ydl_opts, priority=priority)
+            self.resolution_cache.set(query, ydl_opts, results)
+            future.set_result(results)
             return results
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody else was waiting on it
+            raise
+        finally:
+            del self._pending_extractions[key]
+
+    def get_queue(self, guild_id):
+        """Returns the guild's queue, creating it on first use."""
+        queue = self.song_queues.get(guild_id)
+        if queue is None:
+            queue = self.song_queues[guild_id] = TrackQueue()
+        return queue
+
+    async def resolve_stream(self, query, priority=PRIORITY_INTERACTIVE):
+        """Resolves a queued query to a playable stream (cached by search_ytdlp_async)."""
+        results = await self.search_ytdlp_async(query, STREAM_YDL_OPTS, priority=priority)
+        info = results['entries'][0] if 'entries' in results else results
+        if info.get('related_videos') and info.get('id') not in self.related_graph:
+            # Free graph data from an extraction we ran anyway.
+            asyncio.create_task(self.related_graph.record(info['id'], info['related_videos']))
+        return ResolvedStream.from_info(results)
+
+    async def create_source(self, guild_id, stream, start_offset=0.0, priority=PRIORITY_INTERACTIVE):
+        """Spawns ffmpeg for a stream at the guild's volume, preferring a locally cached copy.
+
+        A stream picked from the audio cache has no URL. If its file was evicted since, the track is
+        resolved through yt-dlp instead and `stream` is updated in place.
+        """
+        volume = self.volumes.get(guild_id, DEFAULT_VOLUME)
+        local_path = self.audio_cache.path_for(stream.video_id) if self.audio_cache else None
+        if local_path is not None:
+            try:
+                return create_audio_source(stream, volume, mode=self.playback_mode, start_offset=start_offset,
+                                           local_path=local_path)
+            except FileNotFoundError:
+                pass
+        if stream.url is None:
+            resolved = await self.resolve_stream(f"https://www.youtube.com/watch?v={stream.video_id}", priority=priority)
+            if resolved is None:
+                raise discord.ClientException(f"Cached audio for {stream.video_id} is gone and it could not be resolved.")
+            stream.url, stream.acodec, stream.expires_at = resolved.url, resolved.acodec, resolved.expires_at
+        return create_audio_source(stream, volume, mode=self.playback_mode, start_offset=start_offset)
 
-    async def play_next_song(self, guild_id, interaction):
-        voice_client = interaction.guild.voice_client
+    def _cached_stream(self, track):
+        """Builds a stream for a track we hold locally, skipping yt-dlp entirely."""
+        if self.audio_cache is None:
+            return None
+        video_id = youtube_video_id(track.query)
+        path = self.audio_cache.path_for(video_id)
+        if path is None:
+            return None
+        acodec = 'opus' if path.endswith(('.webm', '.opus', '.ogg')) else None
+        return ResolvedStream(None, acodec, video_id)
+
+    def _record_play(self, track):
+        if self.audio_cache is not None and self.audio_cache.record_play(track.stream.video_id):
+            asyncio.create_task(self.audio_cache.download(track.stream.video_id, track.query, self.extraction_pool))
+
+    def set_volume(self, guild_id, volume):
+        """Stores a guild's volume and applies it to whatever is currently playing."""
+        self.volumes[guild_id] = volume
+        self.state_store.mark_dirty(guild_id)
+
+        guild = self.bot.get_guild(int(guild_id))
+        voice_client = guild.voice_client if guild else None
+        playing = voice_client and (voice_client.is_playing() or voice_client.is_paused())
+        source = voice_client.source if playing else None
+        if isinstance(source, TrackedSource) and not source.set_volume(volume):
+            # Opus sources carry the volume in ffmpeg's filter, so restart ffmpeg where we are.
+            asyncio.create_task(self._restart_source(guild_id, voice_client, source))
+
+        prepared = self.prepared_tracks.get(guild_id)
+        if prepared is not None and prepared.source is not None and not prepared.source.set_volume(volume):
+            prepared.source.cleanup()
+            prepared.source = None
+
+    async def _restart_source(self, guild_id, voice_client, source):
+        try:
+            replacement = await self.create_source(guild_id, source.stream, start_offset=source.position)
+        except Exception as e:
+            print(f"Could not apply the new volume in guild {guild_id}: {e}")
+            return
+        if voice_client.source is not source:
+            replacement.cleanup()  # The song changed while ffmpeg was starting.
+            return
+        paused = voice_client.is_paused()
+        voice_client.source = replacement
+        if paused:
+            voice_client.pause()  # Swapping the source resumes the player.
+        source.cleanup()
+
+    def schedule_prefetch(self, guild_id):
+        """Starts resolving (and optionally buffering) the track at the head of the queue."""
+        self.invalidate_prefetch(guild_id)
+        queue = self.song_queues.get(guild_id)
+        if not queue:
+            return
+        prepared = PreparedTrack(queue[0])
+        prepared.task = asyncio.create_task(self._prepare_track(guild_id, prepared))
+        self.prepared_tracks[guild_id] = prepared
+
+    async def _prepare_track(self, guild_id, prepared):
+        try:
+            prepared.track.stream = (self._cached_stream(prepared.track)
+                                     or await self.resolve_stream(prepared.track.query, priority=PRIORITY_PREFETCH))
+        except Exception as e:
+            print(f"Prefetch error for '{prepared.track.title}': {e}")
+            return
+        # The queue may have changed while we were resolving.
+        if self.prebuffer_audio and prepared.track.stream and self.prepared_tracks.get(guild_id) is prepared:
+            try:
+                source = await self.create_source(guild_id, prepared.track.stream, priority=PRIORITY_PREFETCH)
+            except Exception as e:
+                print(f"Prebuffer error for '{prepared.track.title}': {e}")
+                return
+            if self.prepared_tracks.get(guild_id) is prepared:
+                prepared.source = source
+            else:
+                source.cleanup()
+
+    def invalidate_prefetch(self, guild_id):
+        prepared = self.prepared_tracks.pop(guild_id, None)
+        if prepared is not None:
+            prepared.discard()
+
+    def on_queue_changed(self, guild_id):
+        """Called after the queue is edited: persists it and keeps the lookahead on the next song."""
+        self.state_store.mark_dirty(guild_id, queue=True)
+        queue = self.song_queues.get(guild_id)
+        prepared = self.prepared_tracks.get(guild_id)
+        head = queue[0] if queue else None
+        if prepared is not None and prepared.track is head:
+            return
+        self.invalidate_prefetch(guild_id)
+
+        guild = self.bot.get_guild(int(guild_id))
+        voice_client = guild.voice_client if guild else None
+        if head is not None and voice_client and (voice_client.is_playing() or voice_client.is_paused()):
+            self.schedule_prefetch(guild_id)
+
+    async def _take_prepared(self, guild_id, track):
+        """Returns the lookahead result for `track`, or None if it was prepared for another song."""
+        prepared = self.prepared_tracks.pop(guild_id, None)
+        if prepared is None:
+            return None
+        if prepared.track is not track:
+            prepared.discard()
+            return None
+        if prepared.task and not prepared.task.done():
+            # Already resolving this exact track, finishing it beats starting over.
+            await asyncio.wait({prepared.task})
+        return prepared
+
+    async def play_next_song(self, guild_id, channel, start_offset=0.0):
+        """Plays the next queued song in `channel`'s guild and announces it in `channel`."""
+        voice_client = channel.guild.voice_client
         if voice_client is None:
             return
 
         if guild_id in self.song_queues and self.song_queues[guild_id]:
-            original_query, title = self.song_queues[guild_id].popleft()
+            track = self.song_queues[guild_id].popleft()
+            self.state_store.mark_dirty(guild_id, queue=True)
+            original_query, title = track.query, track.title
 
-            ffmpeg_options = {
-                "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
-                "options": "-vn",
-            }
-
-            async def try_play(url_to_try):
+            async def try_play(stream, source=None):
                 try:
-                    source = discord.FFmpegPCMAudio(url_to_try, **ffmpeg_options)
-                    volume = self.volumes.get(guild_id, 0.05)
-                    source = discord.PCMVolumeTransformer(source, volume=volume)
+                    volume = self.volumes.get(guild_id, DEFAULT_VOLUME)
+                    if source is not None and (start_offset or not source.set_volume(volume)):
+                        # Prebuffered from the start or with a volume that has since changed.
+                        source.cleanup()
+                        source = None
+                    if source is None:
+                        source = await self.create_source(guild_id, stream, start_offset=start_offset)
 
                     def after_play(error):
                         if error:
                             print(f"Playback error: {error}")
+                        self.bot.loop.call_soon_threadsafe(self.clear_now_playing, guild_id, track)
                         if not self.song_queues[guild_id]:
                             async def add_similar_songs():
                                 try:
-                                    similar_songs = await self.find_similar_songs(original_query)
+                                    similar_songs = await self.find_similar_songs(guild_id, track)
                                     if similar_songs:
                                         self.song_queues[guild_id].extend(similar_songs)
-                                        # Use interaction.channel.send directly, as interaction might be invalid
-                                        channel = self.bot.get_guild(int(guild_id)).get_channel(interaction.channel_id)
+                                        self.on_queue_changed(guild_id)
                                         await channel.send("Adding similar songs to the queue...")
                                 except Exception as e:
                                     print(f"Error finding similar songs: {e}")
 
                             asyncio.run_coroutine_threadsafe(add_similar_songs(), self.bot.loop)
                         if self.song_queues[guild_id] or voice_client.is_playing():
-                            asyncio.run_coroutine_threadsafe(self.play_next_song(guild_id, interaction), self.bot.loop)
+                            asyncio.run_coroutine_threadsafe(self.play_next_song(guild_id, channel), self.bot.loop)
                         elif voice_client.is_connected():
                             asyncio.run_coroutine_threadsafe(voice_client.disconnect(), self.bot.loop)
-                            asyncio.run_coroutine_threadsafe(interaction.channel.send("Queue finished, disconnecting."), self.bot.loop)
+                            asyncio.run_coroutine_threadsafe(channel.send("Queue finished, disconnecting."), self.bot.loop)
 
                     voice_client.play(source, after=after_play)
-                    await interaction.channel.send(f"Now playing: **{title}** (Volume: {int(volume * 100)}%)")
+                    self.now_playing[guild_id] = track
+                    self.text_channels[guild_id] = channel.id
+                    self.state_store.mark_dirty(guild_id)
+                    self._record_play(track)
+                    self.recently_played.setdefault(guild_id, deque(maxlen=RECENTLY_PLAYED_WINDOW)).append(
+                        self._video_id(track))
+                    if len(self.song_queues[guild_id]) <= 1:
+                        asyncio.create_task(self._warm_related(track))
+                    self.schedule_prefetch(guild_id)
+                    await channel.send(f"Now playing: **{title}** (Volume: {int(volume * 100)}%)")
                     return True
 
                 except discord.ClientException as e:
                     print(f"FFmpeg error: {e}")
+                    if source is not None:
+                        source.cleanup()
                     return False
                 except Exception as e:
                     print(f"An unexpected error occurred: {e}")
                     return False
 
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'quiet': True,
-                'no_warnings': True,
-                'noplaylist': True,
-                'default_search': 'ytsearch',
-            }
             try:
-                initial_results = await self.search_ytdlp_async(original_query, ydl_opts)
-                if 'entries' in initial_results:
-                    initial_url = initial_results['entries'][0]['url']
-                elif 'url' in initial_results:
-                    initial_url = initial_results['url']
-                else:
-                    await interaction.channel.send("Failed to find a playable URL.")
-                    asyncio.run_coroutine_threadsafe(self.play_next_song(guild_id, interaction), self.bot.loop)
+                prepared = await self._take_prepared(guild_id, track)
+                source = prepared.source if prepared is not None else None
+                if track.stream is None or not track.stream.is_fresh():
+                    if source is not None:
+                        source.cleanup()
+                        source = None
+                    track.stream = self._cached_stream(track) or await self.resolve_stream(original_query)
+                stream = track.stream
+
+                if not stream:
+                    await channel.send("Failed to find a playable URL.")
+                    asyncio.run_coroutine_threadsafe(self.play_next_song(guild_id, channel), self.bot.loop)
                     return
 
-                if not await try_play(initial_url):
-                    await interaction.channel.send("Failed to play the song.")
-                    asyncio.run_coroutine_threadsafe(self.play_next_song(guild_id, interaction), self.bot.loop)
+                if not await try_play(stream, source):
+                    await channel.send("Failed to play the song.")
+                    asyncio.run_coroutine_threadsafe(self.play_next_song(guild_id, channel), self.bot.loop)
 
             except Exception as e:
                 print(f"Extraction error: {e}")
-                await interaction.channel.send("An error occurred during extraction.")
-                asyncio.run_coroutine_threadsafe(self.play_next_song(guild_id, interaction), self.bot.loop)
+                await channel.send("An error occurred during extraction.")
+                asyncio.run_coroutine_threadsafe(self.play_next_song(guild_id, channel), self.bot.loop)
 
         elif voice_client.is_connected():
             asyncio.run_coroutine_threadsafe(voice_client.disconnect(), self.bot.loop)
-            asyncio.run_coroutine_threadsafe(interaction.channel.send("Queue finished, disconnecting."), self.bot.loop)
-
-    async def find_similar_songs(self, original_query):
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'quiet': True,
-            'no_warnings': True,
-            'noplaylist': True,
-            'default_search': 'ytsearch',
-            'extract_flat': 'in_playlist'
-        }
+            asyncio.run_coroutine_threadsafe(channel.send("Queue finished, disconnecting."), self.bot.loop)
+
+    def clear_now_playing(self, guild_id, track):
+        if self.now_playing.get(guild_id) is track:
+            del self.now_playing[guild_id]
+            self.state_store.mark_dirty(guild_id)
+
+    # --- Persistence -----------------------------------------------------------------
+
+    def _guild_snapshot(self, guild_id):
+        track = self.now_playing.get(guild_id)
+        volume = self.volumes.get(guild_id)
+        if track is None and volume is None:
+            return None
+
+        row = {"volume": volume}
+        guild = self.bot.get_guild(int(guild_id))
+        voice_client = guild.voice_client if guild else None
+        if track is not None and voice_client is not None:
+            source = voice_client.source
+            row.update(
+                text_channel_id=self.text_channels.get(guild_id),
+                voice_channel_id=voice_client.channel.id,
+                current_query=track.query,
+                current_title=track.title,
+                current_duration=track.duration,
+                current_requester=track.requester,
+                position=source.position if isinstance(source, TrackedSource) else 0.0,
+            )
+        return row
+
+    def _queue_snapshot(self, guild_id):
+        queue = self.song_queues.get(guild_id) or ()
+        return [(track.query, track.title, track.duration, track.requester) for track in queue]
+
+    async def _checkpoint_positions(self):
+        """Periodically records how far into each song we are, so a restart resumes close to it."""
+        while True:
+            await asyncio.sleep(POSITION_CHECKPOINT_INTERVAL)
+            for guild_id in self.now_playing:
+                self.state_store.mark_dirty(guild_id)
+
+    async def cog_load(self):
+        await self.state_store.open()
+        await self.related_graph.open()
+        await self.search_index.open()
+        if self.audio_cache is not None:
+            await self.audio_cache.load()
+        self.volumes.update(await self.state_store.load_volumes())
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_positions())
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # on_ready fires again after every reconnect; only restore once per process.
+        if self._restored:
+            return
+        self._restored = True
         try:
-            results = await self.search_ytdlp_async(original_query, ydl_opts)
+            rows = await self.state_store.load_resumable()
+        except Exception as e:
+            print(f"Could not load saved music state: {e}")
+            return
+        for row in rows:
+            # Other clusters resume their own guilds; forgetting theirs here would delete their saved queues.
+            if owns_guild(self.bot, row["guild_id"]):
+                asyncio.create_task(self._resume_guild(row))
+
+    async def _resume_guild(self, row):
+        """Reconnects to a guild's voice channel and continues its song from the saved position."""
+        guild_id = row["guild_id"]
+        guild = self.bot.get_guild(int(guild_id))
+        voice_channel = guild.get_channel(row["voice_channel_id"]) if guild and row["voice_channel_id"] else None
+        channel = guild.get_channel(row["text_channel_id"]) if guild and row["text_channel_id"] else None
+        if voice_channel is None or channel is None or guild.voice_client is not None:
+            # Nothing to resume into, forget the saved queue.
+            self.state_store.mark_dirty(guild_id, queue=True)
+            return
+
+        async with self._resume_limit:
+            try:
+                saved_queue = await self.state_store.load_queue(guild_id)
+                await voice_channel.connect()
+            except Exception as e:
+                print(f"Could not resume music in guild {guild_id}: {e}")
+                self.state_store.mark_dirty(guild_id, queue=True)
+                return
+
+            queue = self.get_queue(guild_id)
+            queue.extend(Track(*saved) for saved in saved_queue)
+            queue.insert_next(Track(row["current_query"], row["current_title"],
+                                    duration=row["current_duration"], requester=row["current_requester"]))
+            try:
+                await channel.send(f"Resuming **{row['current_title']}** after a restart.")
+            except discord.HTTPException:
+                pass
+            await self.play_next_song(guild_id, channel, start_offset=row["position"] or 0.0)
+
+    def _video_id(self, track):
+        if track.stream is not None and track.stream.video_id:
+            return track.stream.video_id
+        return youtube_video_id(track.query)
+
+    async def fetch_related(self, track):
+        """Runs the yt-dlp extraction that lists a track's related videos and stores them in the graph."""
+        try:
+            results = await self.search_ytdlp_async(track.query, RELATED_YDL_OPTS, priority=PRIORITY_BACKGROUND)
             if 'entries' in results:
                 results = results['entries'][0]
-            if 'related_videos' in results:
-                similar_songs = deque()
-                for related_video in results['related_videos'][:3]:
-                    similar_songs.append((related_video['webpage_url'], related_video['title']))
-                return similar_songs
-            else:
+            await self.related_graph.record(results.get('id') or self._video_id(track), results.get('related_videos'))
+        except Exception as e:
+            print(f"Error fetching related songs: {e}")
+
+    async def _warm_related(self, track):
+        """Makes sure the graph knows the neighbours of a playing track before the queue runs dry."""
+        node = await self.related_graph.get(self._video_id(track))
+        if node is None or self.related_graph.is_stale(node):
+            await self.fetch_related(track)
+
+    async def find_similar_songs(self, guild_id, track):
+        """Picks autoplay songs from the related-track graph, skipping anything played recently."""
+        try:
+            video_id = self._video_id(track)
+            recent = self.recently_played.get(guild_id, ())
+            picks, node = await self.related_graph.pick(video_id, recent, count=AUTOPLAY_SONGS)
+            if not picks:
+                # Never seen (or only recently played neighbours), so this one has to wait on yt-dlp.
+                await self.fetch_related(track)
+                picks, node = await self.related_graph.pick(video_id, recent, count=AUTOPLAY_SONGS)
+            elif self.related_graph.is_stale(node):
+                asyncio.create_task(self.fetch_related(track))
+
+            if not picks:
                 return None
+            return [Track(related.url, related.title, duration=related.duration) for related in picks]
         except Exception as e:
             print(f"Error finding similar songs: {e}")
             return None
 
-async def setup(bot: commands.Bot):
-    await bot.add_cog(MusicCog(bot))
+    def cancel_playlist_ingestion(self, guild_id):
+        """Stops a background playlist load for a guild. Returns False if none was running."""
+        task = self.playlist_ingestions.pop(guild_id, None)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def cog_unload(self):
+        for guild_id in list(self.prepared_tracks):
+            self.invalidate_prefetch(guild_id)
+        for guild_id in list(self.playlist_ingestions):
+            self.cancel_playlist_ingestion(guild_id)
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+        # Save final positions so the next start resumes where we stopped.
+        for guild_id in self.now_playing:
+            self.state_store.mark_dirty(guild_id)
+        await self.state_store.close()
+        if self.audio_cache is not None:
+            await self.audio_cache.close()
+
+async def setup(bot: commands.Bot, music_cog: MusicCog = None):
+    # The command cogs hold a reference to the MusicCog they were given, so main() passes that
+    # same instance in here rather than us creating a second one with its own state.
+    await bot.add_cog(music_cog or MusicCog(bot))
     print("MusicCog loaded!")
\ No newline at end of file
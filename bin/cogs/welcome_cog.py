@@ -1,22 +1,91 @@
 import discord
 from discord.ext import commands
-import json
+import asyncio
+import time
+
+from bin.utils.config_service import ConfigService
+from bin.utils.guild_settings import migrate_names_to_ids
+
+# Settings used to be stored by name, which broke whenever the channel or role was renamed.
+LEGACY_NAME_FIELDS = {
+    "welcome_channel_name": ("welcome_channel_id", "text_channels"),
+    "welcome_role_name": ("welcome_role_id", "roles"),
+}
+
+# Joins within this many seconds of the previous welcome are greeted together.
+BURST_WINDOW = 5.0
+COMBINED_WELCOME_MENTIONS = 10
+# Pause between role assignments while members are waiting for one.
+ROLE_ASSIGN_INTERVAL = 0.5
+# A guild's workers stop after this many seconds without joins; the next join starts them again.
+WORKER_IDLE_TIMEOUT = 300.0
+
+
+async def next_join(queue: asyncio.Queue):
+    """Waits for the next queued join. Returns None once the queue has been idle for WORKER_IDLE_TIMEOUT."""
+    while True:
+        try:
+            return await asyncio.wait_for(queue.get(), WORKER_IDLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            # No await between this check and the worker returning, so a join can't slip in unseen.
+            if queue.empty():
+                return None
+
+
+class GuildJoinQueue:
+    """Pending joins and counters for one guild's welcome and role workers."""
+
+    def __init__(self):
+        self.welcome_queue = asyncio.Queue()  # (member, enqueued_at)
+        self.role_queue = asyncio.Queue()
+        self.welcome_task = None
+        self.role_task = None
+        self.last_welcome = float("-inf")
+        self.joins = 0
+        self.welcome_messages = 0
+        self.roles_assigned = 0
+        self.role_failures = 0
+        self.latency = {"welcome": [0, 0.0, 0.0], "role": [0, 0.0, 0.0]}  # kind -> [count, total, max]
+
+    def record_latency(self, kind, enqueued_times):
+        now = time.monotonic()
+        entry = self.latency[kind]
+        for enqueued_at in enqueued_times:
+            waited = now - enqueued_at
+            entry[0] += 1
+            entry[1] += waited
+            entry[2] = max(entry[2], waited)
+
+    def stats(self):
+        stats = {
+            "joins": self.joins,
+            "welcome_messages": self.welcome_messages,
+            "welcome_backlog": self.welcome_queue.qsize(),
+            "role_backlog": self.role_queue.qsize(),
+            "roles_assigned": self.roles_assigned,
+            "role_failures": self.role_failures,
+        }
+        for kind, (count, total, worst) in self.latency.items():
+            stats[f"{kind}_avg"] = total / count if count else 0.0
+            stats[f"{kind}_max"] = worst
+        return stats
+
 
 class Welcome(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, config: ConfigService):
         self.bot = bot
-        self.load_config()
+        self.config = config
+        self.join_queues = {}  # guild_id -> GuildJoinQueue
 
-    def load_config(self):
-        try:
-            with open("server_config.json", "r") as f:
-                self.server_config = json.load(f)
-        except FileNotFoundError:
-            self.server_config = {}
+    def migrate_guild(self, guild: discord.Guild):
+        settings = self.config.section(guild.id, "welcome")
+        if settings and migrate_names_to_ids(settings, guild, LEGACY_NAME_FIELDS):
+            self.config.mark_dirty(guild.id)
 
-    def save_config(self):
-        with open("server_config.json", "w") as f:
-            json.dump(self.server_config, f, indent=4)
+    @commands.Cog.listener()
+    async def on_ready(self):
+        for guild in self.bot.guilds:
+            self.migrate_guild(guild)
 
     async def check_permissions(self, interaction: discord.Interaction):
         """Checks if the user has both Manage Channels and Manage Roles permissions."""
@@ -32,11 +101,8 @@ class Welcome(commands.Cog):
         if not await self.check_permissions(interaction):
             return
 
-        guild_id = str(interaction.guild.id)
-        if guild_id not in self.server_config:
-            self.server_config[guild_id] = {}
-        self.server_config[guild_id]["welcome_channel_name"] = channel.name
-        self.save_config()
+        self.config.set(interaction.guild.id, "welcome", "welcome_channel_id", channel.id)
+        self.config.pop(interaction.guild.id, "welcome", "welcome_channel_name")
         await interaction.response.send_message(f"Welcome channel set to {channel.mention}", ephemeral=True)
 
     @discord.app_commands.command(name="setwelcomerole", description="Sets the welcome role for this server.")
@@ -45,39 +111,82 @@ class Welcome(commands.Cog):
         if not await self.check_permissions(interaction):
             return
 
-        guild_id = str(interaction.guild.id)
-        if guild_id not in self.server_config:
-            self.server_config[guild_id] = {}
-        self.server_config[guild_id]["welcome_role_name"] = role.name
-        self.save_config()
+        self.config.set(interaction.guild.id, "welcome", "welcome_role_id", role.id)
+        self.config.pop(interaction.guild.id, "welcome", "welcome_role_name")
         await interaction.response.send_message(f"Welcome role set to {role.name}", ephemeral=True)
 
+    def get_join_queue(self, guild_id: int) -> "GuildJoinQueue":
+        """Returns the guild's queues, (re)starting its workers if they stopped while idle."""
+        state = self.join_queues.get(guild_id)
+        if state is None:
+            state = self.join_queues[guild_id] = GuildJoinQueue()
+        if state.welcome_task is None or state.welcome_task.done():
+            state.welcome_task = asyncio.create_task(self.welcome_worker(guild_id, state))
+        if state.role_task is None or state.role_task.done():
+            state.role_task = asyncio.create_task(self.role_worker(guild_id, state))
+        return state
+
+    async def cog_unload(self):
+        for state in self.join_queues.values():
+            for task in (state.welcome_task, state.role_task):
+                if task is not None:
+                    task.cancel()
+
     @commands.Cog.listener()
     async def on_member_join(self, member):
-        """Welcomes a new member and gives them a role."""
-        guild_id = str(member.guild.id)
-        config = self.server_config.get(guild_id)
-
-        if not config:
+        """Queues a new member to be welcomed and given a role."""
+        if not self.config.section(member.guild.id, "welcome"):
             return
+        state = self.get_join_queue(member.guild.id)
+        state.joins += 1
+        now = time.monotonic()
+        state.welcome_queue.put_nowait((member, now))
+        state.role_queue.put_nowait((member, now))
 
-        welcome_channel_name = config.get("welcome_channel_name")
-        welcome_role_name = config.get("welcome_role_name")
+    def resolve_welcome_targets(self, guild: discord.Guild):
+        self.migrate_guild(guild)
+        config = self.config.section(guild.id, "welcome")
 
-        # Add some debugging info
-        print(f"Welcome Channel: {welcome_channel_name}")
-        print(f"Welcome Role: {welcome_role_name}")
+        welcome_channel_id = config.get("welcome_channel_id")
+        welcome_role_id = config.get("welcome_role_id")
+        # ID lookups hit discord.py's per-guild caches, which channel/role events keep current.
+        welcome_channel = guild.get_channel(welcome_channel_id) if welcome_channel_id else None
+        role = guild.get_role(welcome_role_id) if welcome_role_id else None
+        return welcome_channel, role
 
-        welcome_channel = discord.utils.get(member.guild.text_channels, name=welcome_channel_name)
-        role = discord.utils.get(member.guild.roles, name=welcome_role_name)
-        guild_name = member.guild.name
+    async def welcome_worker(self, guild_id: int, state: "GuildJoinQueue"):
+        """Sends welcomes for one guild. Joins arriving within BURST_WINDOW of the last welcome share one message."""
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await next_join(state.welcome_queue)
+            if first is None:
+                return
+            batch = [first]
+            wait = state.last_welcome + BURST_WINDOW - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            while not state.welcome_queue.empty():
+                batch.append(state.welcome_queue.get_nowait())
 
-        print(f"Welcome Channel Object: {welcome_channel}") # Debugging Line
-        print(f"Welcome Role Object: {role}") # Debugging Line
+            members = [member for member, _ in batch if member.guild.get_member(member.id) is not None]
+            try:
+                if members and await self.send_welcome(members):
+                    state.welcome_messages += 1
+            except Exception as e:
+                print(f"Error sending welcome message: {e}")
+            state.last_welcome = loop.time()
+            state.record_latency("welcome", [enqueued_at for _, enqueued_at in batch])
+
+    async def send_welcome(self, members):
+        guild = members[0].guild
+        welcome_channel, _ = self.resolve_welcome_targets(guild)
+        if not welcome_channel:
+            return False
+        guild_name = guild.name
 
-        if welcome_channel:
+        if len(members) == 1:
+            member = members[0]
             welcome_message = f"Welcome to the {guild_name}, {member.mention}!"
-            
             embed = discord.Embed(
                 title=f"Welcome to the {guild_name}!",
                 description=f"We're glad to have you here, {member.mention}!",
@@ -90,27 +199,101 @@ class Welcome(commands.Cog):
                 # Use Discord's Default Profile Picture
                 default_avatar_url = "https://cdn.discordapp.com/embed/avatars/0.png"
                 embed.set_thumbnail(url=default_avatar_url)
+        else:
+            # A burst of joins gets one message instead of one per member.
+            mentions = [member.mention for member in members[:COMBINED_WELCOME_MENTIONS]]
+            others = len(members) - len(mentions)
+            if others:
+                who = f"{', '.join(mentions)} and {others} other{'s' if others != 1 else ''}"
+            else:
+                who = f"{', '.join(mentions[:-1])} and {mentions[-1]}"
+            welcome_message = f"Welcome to the {guild_name}, {who}!"
+            embed = discord.Embed(
+                title=f"Welcome to the {guild_name}!",
+                description=f"We're glad to have all {len(members)} of you here!",
+                color=discord.Color.green()
+            )
+            if guild.icon:
+                embed.set_thumbnail(url=guild.icon.url)
+
+        await welcome_channel.send(welcome_message, embed=embed)
+        return True
 
-            print(f"Attempting to send welcome message to channel: {welcome_channel.name} ({welcome_channel.id})") # Debugging Line
-            print(f"Welcome Message Content: {welcome_message}") # Debugging Line
-            print(f"Embed Title: {embed.title}, Embed Description: {embed.description}") # Debugging Line
+    async def role_worker(self, guild_id: int, state: "GuildJoinQueue"):
+        """Gives queued members the welcome role one at a time, spaced out while there is a backlog."""
+        while True:
+            join = await next_join(state.role_queue)
+            if join is None:
+                return
+            member, enqueued_at = join
             try:
-                await welcome_channel.send(welcome_message, embed=embed) # Send the plain text message and then the embed
-                print("Welcome message sent successfully!") # Debugging Line
+                await self.assign_welcome_role(member, enqueued_at, state)
             except Exception as e:
-                print(f"Error sending welcome message: {e}") # Debugging Line
+                # One bad join must not stop the worker; later joins would never get the role.
+                print(f"Error assigning the welcome role in guild {guild_id}: {e}")
 
-        if role:
-            try:
-                await member.add_roles(role)
-            except discord.Forbidden:
-                if welcome_channel:
-                    await welcome_channel.send(f"Could not give {member.mention} the {role.name} role. Bot lacks permissions.")
-            except discord.HTTPException:
-                if welcome_channel:
-                    await welcome_channel.send(f"Failed to give {member.mention} the {role.name} role. An unexpected error occurred.")
+            if not state.role_queue.empty():
+                # discord.py waits out 429s, but pacing ourselves keeps a raid from starving other requests.
+                await asyncio.sleep(ROLE_ASSIGN_INTERVAL)
+
+    async def assign_welcome_role(self, member, enqueued_at, state: "GuildJoinQueue"):
+        if member.guild.get_member(member.id) is None:
+            return  # Left before we got to them.
+        welcome_channel, role = self.resolve_welcome_targets(member.guild)
+        if not role:
+            return
+
+        try:
+            await member.add_roles(role)
+            state.roles_assigned += 1
+        except discord.Forbidden:
+            state.role_failures += 1
+            # Every queued member would fail the same way; report it once for the whole backlog.
+            skipped = state.role_queue.qsize()
+            while not state.role_queue.empty():
+                state.role_queue.get_nowait()
+            state.role_failures += skipped
+            who = member.mention if not skipped else f"{skipped + 1} new members"
+            await self.report_role_error(welcome_channel, f"Could not give {who} the {role.name} role. Bot lacks permissions.")
+        except discord.HTTPException:
+            state.role_failures += 1
+            await self.report_role_error(
+                welcome_channel, f"Failed to give {member.mention} the {role.name} role. An unexpected error occurred."
+            )
+        state.record_latency("role", [enqueued_at])
+
+    async def report_role_error(self, welcome_channel, text):
+        if not welcome_channel:
+            return
+        try:
+            await welcome_channel.send(text)
+        except discord.HTTPException as e:
+            print(f"Could not report a welcome role error: {e}")
+
+    @discord.app_commands.command(name="welcomestats", description="Show join queue statistics for this server.")
+    @discord.app_commands.default_permissions(manage_guild=True)
+    async def welcomestats(self, interaction: discord.Interaction):
+        if not interaction.guild:
+            await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+            return
+        if not interaction.user.guild_permissions.manage_guild:
+            await interaction.response.send_message("You need 'Manage Server' permissions to use this command.", ephemeral=True)
+            return
+        state = self.join_queues.get(interaction.guild.id)
+        if state is None:
+            await interaction.response.send_message("No joins have been processed since the bot started.", ephemeral=True)
+            return
+        stats = state.stats()
+        await interaction.response.send_message(
+            f"**Joins**: {stats['joins']} | Welcome messages: {stats['welcome_messages']}\n"
+            f"**Backlog**: {stats['welcome_backlog']} to welcome, {stats['role_backlog']} awaiting the role\n"
+            f"**Roles**: {stats['roles_assigned']} assigned, {stats['role_failures']} failed\n"
+            f"**Latency**: welcome avg {stats['welcome_avg']:.1f}s (max {stats['welcome_max']:.1f}s), "
+            f"role avg {stats['role_avg']:.1f}s (max {stats['role_max']:.1f}s)",
+            ephemeral=True,
+        )
 
 
-async def setup(bot):
-    await bot.add_cog(Welcome(bot))
+async def setup(bot, config: ConfigService):
+    await bot.add_cog(Welcome(bot, config))
     print("Welcome Cog loaded!")
\ No newline at end of file
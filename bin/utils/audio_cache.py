@@ -0,0 +1,187 @@
+import asyncio
+import functools
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from bin.utils.extraction_pool import PRIORITY_BACKGROUND
+from bin.utils.lazy_import import lazy_import
+
+yt_dlp = lazy_import("yt_dlp")
+
+INDEX_FILE = "index.json"
+MAX_TRACKED_PLAY_COUNTS = 10000
+
+POLICY_LRU = "lru"
+POLICY_LFU = "lfu"
+
+
+def download_audio(url, directory):
+    """Runs inside an extraction pool worker. Saves the best Opus audio as-is (no re-encode) and returns its path."""
+    ydl_opts = {
+        'format': 'bestaudio[acodec=opus]/bestaudio',
+        'outtmpl': os.path.join(directory, '%(id)s.%(ext)s'),
+        'noplaylist': True,
+        'quiet': True,
+        'no_warnings': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        return ydl.prepare_filename(info)
+
+
+class CachedTrack:
+    __slots__ = ('path', 'size', 'plays', 'last_access')
+
+    def __init__(self, path, size, plays=0, last_access=0.0):
+        self.path = path
+        self.size = size
+        self.plays = plays
+        self.last_access = last_access
+
+
+class AudioCache:
+    """Keeps local copies of frequently played tracks within a disk budget.
+
+    A track is downloaded (in its native container, usually Opus/WebM) once it
+    has been played `min_plays` times. When the cache grows past `max_bytes`
+    the least recently used (or, with the "lfu" policy, least played) files
+    are deleted first.
+    """
+
+    def __init__(self, directory, max_bytes, min_plays=3, policy=POLICY_LRU):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self.policy = policy if policy in (POLICY_LRU, POLICY_LFU) else POLICY_LRU
+        self.entries = {}  # video_id -> CachedTrack
+        self.play_counts = OrderedDict()  # video_id -> plays, for tracks not cached yet
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self._downloading = set()
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-cache")
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io, functools.partial(func, *args))
+
+    async def load(self):
+        await self._run(self._load_index)
+
+    def _load_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+
+        for video_id, entry in data.get("entries", {}).items():
+            path = entry.get("path")
+            if path and os.path.exists(path):
+                size = os.path.getsize(path)
+                self.entries[video_id] = CachedTrack(path, size, entry.get("plays", 0), entry.get("last_access", 0.0))
+                self.bytes_used += size
+        self.play_counts.update(data.get("play_counts", {}))
+
+    def _save_index(self, data):
+        path = os.path.join(self.directory, INDEX_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _index_data(self):
+        return {
+            "entries": {
+                video_id: {"path": entry.path, "plays": entry.plays, "last_access": entry.last_access}
+                for video_id, entry in self.entries.items()
+            },
+            "play_counts": dict(self.play_counts),
+        }
+
+    async def save(self):
+        await self._run(self._save_index, self._index_data())
+
+    def path_for(self, video_id):
+        """Returns the local file for a track, or None if it isn't cached."""
+        entry = self.entries.get(video_id) if video_id else None
+        if entry is None:
+            return None
+        entry.last_access = time.time()
+        return entry.path
+
+    def record_play(self, video_id):
+        """Counts a play. Returns True when the track has earned a local copy and should be downloaded."""
+        if not video_id:
+            return False
+        entry = self.entries.get(video_id)
+        if entry is not None:
+            self.hits += 1
+            entry.plays += 1
+            entry.last_access = time.time()
+            return False
+
+        self.misses += 1
+        plays = self.play_counts.pop(video_id, 0) + 1
+        self.play_counts[video_id] = plays
+        while len(self.play_counts) > MAX_TRACKED_PLAY_COUNTS:
+            self.play_counts.popitem(last=False)
+        return plays >= self.min_plays and video_id not in self._downloading
+
+    async def download(self, video_id, url, extraction_pool):
+        """Fetches a track into the cache on the extraction pool's background priority."""
+        self._downloading.add(video_id)
+        try:
+            path = await extraction_pool.submit(download_audio, url, self.directory, priority=PRIORITY_BACKGROUND)
+            size = await self._run(os.path.getsize, path)
+            if size > self.max_bytes:
+                await self._run(os.remove, path)
+                return
+            self.entries[video_id] = CachedTrack(path, size, self.play_counts.pop(video_id, 0), time.time())
+            self.bytes_used += size
+            await self._evict()
+            await self.save()
+        except Exception as e:
+            print(f"Error caching audio for {video_id}: {e}")
+        finally:
+            self._downloading.discard(video_id)
+
+    async def _evict(self):
+        victims = []
+        while self.bytes_used > self.max_bytes and self.entries:
+            if self.policy == POLICY_LFU:
+                video_id = min(self.entries, key=lambda k: (self.entries[k].plays, self.entries[k].last_access))
+            else:
+                video_id = min(self.entries, key=lambda k: self.entries[k].last_access)
+            entry = self.entries.pop(video_id)
+            self.bytes_used -= entry.size
+            victims.append(entry.path)
+        for path in victims:
+            try:
+                await self._run(os.remove, path)
+            except OSError as e:
+                print(f"Could not delete cached audio {path}: {e}")
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes_used": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+            "downloading": len(self._downloading),
+        }
+
+    async def close(self):
+        await self.save()
+        self._io.shutdown(wait=False)
@@ -0,0 +1,166 @@
+import mmap
+import re
+import threading
+import time
+import weakref
+
+import discord
+
+from bin.utils.resolution_cache import stream_url_expiry
+
+FRAME_SECONDS = 0.02  # Discord voice frames are always 20 ms
+
+FFMPEG_BEFORE_OPTIONS = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
+
+PLAYBACK_OPUS = "opus"
+PLAYBACK_PCM = "pcm"
+
+_open_sources = weakref.WeakSet()  # TrackedSources whose ffmpeg hasn't been cleaned up yet
+
+_YOUTUBE_ID = re.compile(r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/)|youtu\.be/)([A-Za-z0-9_-]{11})")
+
+
+def youtube_video_id(query):
+    """Pulls the video ID out of a YouTube URL without asking yt-dlp."""
+    match = _YOUTUBE_ID.search(query or "")
+    return match.group(1) if match else None
+
+
+class ResolvedStream:
+    """A playable stream picked by yt-dlp for one track."""
+    __slots__ = ('url', 'acodec', 'video_id', 'expires_at')
+
+    def __init__(self, url, acodec=None, video_id=None):
+        self.url = url  # None when the track is played from the local audio cache
+        self.acodec = acodec
+        self.video_id = video_id
+        self.expires_at = stream_url_expiry(url)
+
+    def is_fresh(self, margin=60.0):
+        """False once the signed URL is about to stop working."""
+        return self.expires_at is None or self.expires_at - margin > time.time()
+
+    @classmethod
+    def from_info(cls, info):
+        if 'entries' in info:
+            info = info['entries'][0]
+        if not info.get('url'):
+            return None
+        return cls(info['url'], info.get('acodec'), info.get('id'))
+
+
+class TrackedSource(discord.AudioSource):
+    """Wraps an ffmpeg source so we know how far into the track playback is.
+
+    The position is what lets opus mode change volume (and other features
+    resume a track) by restarting ffmpeg at the current offset.
+    """
+
+    def __init__(self, original, stream, volume, start_offset=0.0, mapped_file=None):
+        self.original = original
+        self.stream = stream
+        self.volume = volume
+        self.start_offset = start_offset
+        self.frames = 0
+        self._mapped_file = mapped_file
+        _open_sources.add(self)
+
+    def read(self):
+        data = self.original.read()
+        if data:
+            self.frames += 1
+        return data
+
+    def is_opus(self):
+        return self.original.is_opus()
+
+    def cleanup(self):
+        _open_sources.discard(self)
+        self.original.cleanup()
+        if self._mapped_file is not None:
+            self._mapped_file.close()
+            self._mapped_file = None
+
+    @property
+    def position(self):
+        return self.start_offset + self.frames * FRAME_SECONDS
+
+    def set_volume(self, volume):
+        """Applies a volume change in place. Returns False when ffmpeg has to be restarted instead."""
+        if self.is_opus():
+            return volume == self.volume
+        self.original.volume = volume
+        self.volume = volume
+        return True
+
+
+def ffmpeg_process_count():
+    """How many ffmpeg processes this bot has spawned and not yet cleaned up (playing or pre-buffered)."""
+    return len(_open_sources)
+
+
+class MappedFile:
+    """A memory-mapped local file that ffmpeg's stdin writer thread reads from.
+
+    discord.py's writer thread may be inside `read` when the source is
+    cleaned up, so closing waits for that read and later reads see end of file.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._lock = threading.Lock()
+
+    def read(self, size=-1):
+        with self._lock:
+            if self._map is None:
+                return b""
+            return self._map.read(size)
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+
+
+def create_audio_source(stream, volume, mode=PLAYBACK_OPUS, start_offset=0.0, local_path=None):
+    """Spawns ffmpeg for a resolved stream, or for a cached local copy when `local_path` is given.
+
+    In opus mode ffmpeg hands Discord ready-made Opus packets: Opus streams at
+    100% volume are copied untouched, anything else is scaled with an ffmpeg
+    volume filter and encoded by ffmpeg, so no per-frame work happens in Python.
+    PCM mode decodes to PCM and scales volume in-process.
+
+    Local files are memory-mapped and fed to ffmpeg through its stdin, so
+    repeated plays are served from the page cache instead of the network.
+    """
+    mapped_file = None
+    if local_path:
+        mapped_file = MappedFile(local_path)
+        source_input, pipe, before_options = mapped_file, True, ""
+    else:
+        source_input, pipe, before_options = stream.url, False, FFMPEG_BEFORE_OPTIONS
+    if start_offset:
+        before_options += f" -ss {start_offset:.2f}"
+
+    try:
+        if mode == PLAYBACK_OPUS:
+            if stream.acodec == 'opus' and volume == 1.0:
+                # discord.py translates codec='opus' into ffmpeg's "-c:a copy".
+                source = discord.FFmpegOpusAudio(
+                    source_input, codec='opus', pipe=pipe, before_options=before_options, options="-vn"
+                )
+            else:
+                source = discord.FFmpegOpusAudio(
+                    source_input, pipe=pipe, before_options=before_options, options=f"-vn -filter:a volume={volume:.3f}"
+                )
+        else:
+            source = discord.FFmpegPCMAudio(source_input, pipe=pipe, before_options=before_options, options="-vn")
+            source = discord.PCMVolumeTransformer(source, volume=volume)
+    except Exception:
+        if mapped_file is not None:
+            mapped_file.close()
+        raise
+
+    return TrackedSource(source, stream, volume, start_offset, mapped_file)
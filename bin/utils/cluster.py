@@ -0,0 +1,67 @@
+import os
+
+
+def shard_id_for(guild_id, shard_count):
+    """The shard Discord sends a guild's events to."""
+    return (int(guild_id) >> 22) % shard_count
+
+
+def owns_guild(bot, guild_id):
+    """Whether this process runs the shard for `guild_id` (always true when it isn't split into clusters)."""
+    shard_ids = getattr(bot, "shard_ids", None)
+    if not bot.shard_count or shard_ids is None:
+        return True
+    return shard_id_for(guild_id, bot.shard_count) in shard_ids
+
+
+class ClusterConfig:
+    """This process's place in the cluster, as passed down by cluster_launcher.py.
+
+    Without the launcher's variables the bot runs as a single process with
+    every shard, exactly as before.
+    """
+
+    def __init__(self, cluster_id=0, cluster_count=1, shard_count=None, shard_ids=None,
+                 ipc_host="127.0.0.1", ipc_port=None, ipc_token=None):
+        self.cluster_id = cluster_id
+        self.cluster_count = cluster_count
+        self.shard_count = shard_count
+        self.shard_ids = shard_ids
+        self.ipc_host = ipc_host
+        self.ipc_port = ipc_port
+        self.ipc_token = ipc_token
+
+    @classmethod
+    def from_env(cls):
+        shard_count = os.getenv("SHARD_COUNT")
+        shard_ids = os.getenv("SHARD_IDS")
+        ipc_port = os.getenv("CLUSTER_IPC_PORT")
+        return cls(
+            cluster_id=int(os.getenv("CLUSTER_ID", "0")),
+            cluster_count=int(os.getenv("CLUSTER_COUNT", "1")),
+            shard_count=int(shard_count) if shard_count else None,
+            shard_ids=[int(shard_id) for shard_id in shard_ids.split(",")] if shard_ids else None,
+            ipc_host=os.getenv("CLUSTER_IPC_HOST", "127.0.0.1"),
+            ipc_port=int(ipc_port) if ipc_port else None,
+            ipc_token=os.getenv("CLUSTER_IPC_TOKEN"),
+        )
+
+    @property
+    def sharded(self):
+        return self.shard_count is not None
+
+    @property
+    def clustered(self):
+        return self.ipc_port is not None
+
+
+def split_shards(shard_count, cluster_count):
+    """Splits shard IDs into `cluster_count` contiguous groups of (nearly) equal size."""
+    cluster_count = max(1, min(cluster_count, shard_count))
+    size, extra = divmod(shard_count, cluster_count)
+    groups, start = [], 0
+    for i in range(cluster_count):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
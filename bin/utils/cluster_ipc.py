@@ -0,0 +1,286 @@
+import asyncio
+import itertools
+import json
+
+MAX_LINE = 1 << 20  # bytes per message
+
+
+class IpcError(Exception):
+    """Raised when a cluster request can't be delivered or answered."""
+
+
+class _Connection:
+    """One end of a hub connection. Messages are JSON objects, one per line."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self._lock = asyncio.Lock()  # drain() must not run concurrently on one transport
+
+    async def send(self, message):
+        async with self._lock:
+            self.writer.write(json.dumps(message).encode() + b"\n")
+            await self.writer.drain()
+
+    def close(self):
+        self.writer.close()
+
+
+class IpcHub:
+    """The launcher's end: routes commands between cluster processes over local TCP.
+
+    A cluster connects, identifies itself with the launcher's token, and then
+    either answers `call`s or sends `request`s, which the hub fans out to the
+    target clusters and answers with every cluster's result in one `response`.
+    """
+
+    def __init__(self, token, host="127.0.0.1", port=0, timeout=5.0):
+        self.token = token
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.clusters = {}  # cluster_id -> _Connection
+        self._ready = {}  # cluster_id -> Event, set once the cluster's shards are ready
+        self._pending = {}  # call id -> Future of the reply
+        self._ids = itertools.count()
+        self._tasks = set()
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_LINE)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._server.close()
+        for conn in list(self.clusters.values()):
+            conn.close()
+        await self._server.wait_closed()
+
+    def ready(self, cluster_id):
+        """An Event set while `cluster_id` is connected and has reported ready."""
+        return self._ready.setdefault(cluster_id, asyncio.Event())
+
+    async def _handle(self, reader, writer):
+        conn = _Connection(writer)
+        cluster_id = None
+        try:
+            hello = json.loads(await reader.readline() or b"null")
+            if not isinstance(hello, dict) or hello.get("op") != "identify" or hello.get("token") != self.token:
+                print("Rejected an IPC connection that didn't identify with the cluster token.")
+                return
+            cluster_id = int(hello["cluster"])
+            previous = self.clusters.get(cluster_id)
+            if previous is not None:
+                previous.close()
+            self.clusters[cluster_id] = conn
+
+            async for line in reader:
+                message = json.loads(line)
+                op = message.get("op")
+                if op == "reply":
+                    future = self._pending.get(message.get("id"))
+                    if future is not None and not future.done():
+                        future.set_result(message)
+                elif op == "ready":
+                    self.ready(cluster_id).set()
+                elif op == "request":
+                    task = asyncio.create_task(self._serve_request(conn, message))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+        except Exception as e:
+            # Includes malformed messages (e.g. a JSON line that isn't an object); the cluster reconnects.
+            print(f"IPC connection from cluster {cluster_id} failed: {e!r}")
+        finally:
+            if cluster_id is not None and self.clusters.get(cluster_id) is conn:
+                del self.clusters[cluster_id]
+                self.ready(cluster_id).clear()
+            conn.close()
+
+    async def call(self, command, args=None, target=None, timeout=None):
+        """Runs `command` on one cluster, or all of them, and returns ({cluster_id: result}, {cluster_id: error})."""
+        targets = list(self.clusters) if target is None else [int(target)]
+        outcomes = await asyncio.gather(
+            *(self._call_one(cluster_id, command, args, timeout or self.timeout) for cluster_id in targets),
+            return_exceptions=True,
+        )
+        results, errors = {}, {}
+        for cluster_id, outcome in zip(targets, outcomes):
+            if isinstance(outcome, IpcError):
+                errors[cluster_id] = str(outcome)
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                results[cluster_id] = outcome
+        return results, errors
+
+    async def _call_one(self, cluster_id, command, args, timeout):
+        conn = self.clusters.get(cluster_id)
+        if conn is None:
+            raise IpcError("not connected")
+        call_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = future
+        try:
+            await conn.send({"op": "call", "id": call_id, "command": command, "args": args or {}})
+            reply = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise IpcError(f"no reply within {timeout:g}s")
+        except ConnectionError as e:
+            raise IpcError(f"connection lost: {e}")
+        finally:
+            self._pending.pop(call_id, None)
+        if "error" in reply:
+            raise IpcError(reply["error"])
+        return reply.get("result")
+
+    async def _serve_request(self, conn, message):
+        results, errors = await self.call(
+            message["command"], message.get("args"), message.get("target"), message.get("timeout")
+        )
+        try:
+            await conn.send({
+                "op": "response",
+                "id": message["id"],
+                "results": {str(cluster_id): result for cluster_id, result in results.items()},
+                "errors": {str(cluster_id): error for cluster_id, error in errors.items()},
+            })
+        except ConnectionError:
+            pass
+
+
+class IpcClient:
+    """A cluster process's end of the hub connection. Reconnects until closed.
+
+    Register commands other clusters may run with `handler`; each receives
+    the request's arguments as keywords and returns something JSON-serializable.
+    """
+
+    def __init__(self, cluster_id, port, token, host="127.0.0.1"):
+        self.cluster_id = cluster_id
+        self.host = host
+        self.port = port
+        self.token = token
+        self.handlers = {}
+        self._conn = None
+        self._is_ready = False
+        self._pending = {}  # request id -> Future of the response
+        self._ids = itertools.count()
+        self._tasks = set()
+        self._task = None
+
+    def handler(self, command):
+        def register(func):
+            self.handlers[command] = func
+            return func
+        return register
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._conn is not None:
+            self._conn.close()
+
+    @property
+    def connected(self):
+        return self._conn is not None
+
+    async def mark_ready(self):
+        """Tells the launcher this cluster's shards are up, so it can start the next one."""
+        self._is_ready = True
+        if self._conn is not None:
+            try:
+                await self._conn.send({"op": "ready"})
+            except ConnectionError:
+                pass
+
+    async def _run(self):
+        delay = 1
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port, limit=MAX_LINE)
+            except OSError as e:
+                print(f"Could not reach the cluster launcher at {self.host}:{self.port}: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+            delay = 1
+            conn = _Connection(writer)
+            try:
+                await conn.send({"op": "identify", "cluster": self.cluster_id, "token": self.token})
+                if self._is_ready:
+                    await conn.send({"op": "ready"})
+                self._conn = conn
+                await self._read(reader)
+            except Exception as e:
+                # Anything, down to a malformed message, just means reconnecting.
+                print(f"Lost the connection to the cluster launcher: {e!r}")
+            finally:
+                self._conn = None
+                conn.close()
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(IpcError("connection to the cluster launcher lost"))
+            await asyncio.sleep(delay)
+
+    async def _read(self, reader):
+        async for line in reader:
+            message = json.loads(line)
+            op = message.get("op")
+            if op == "call":
+                task = asyncio.create_task(self._serve_call(message))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            elif op == "response":
+                future = self._pending.get(message.get("id"))
+                if future is not None and not future.done():
+                    future.set_result(message)
+
+    async def _serve_call(self, message):
+        command = message.get("command")
+        try:
+            handler = self.handlers.get(command)
+            if handler is None:
+                raise LookupError(f"unknown command '{command}'")
+            reply = {"op": "reply", "id": message["id"], "result": await handler(**message.get("args", {}))}
+        except Exception as e:
+            reply = {"op": "reply", "id": message["id"], "error": f"{type(e).__name__}: {e}"}
+        conn = self._conn
+        if conn is not None:
+            try:
+                await conn.send(reply)
+            except ConnectionError:
+                pass
+
+    async def request(self, command, args=None, target=None, timeout=5.0):
+        """Runs `command` on every cluster (this one included), or only on `target`.
+
+        Returns ({cluster_id: result}, {cluster_id: error}).
+        """
+        conn = self._conn
+        if conn is None:
+            raise IpcError("not connected to the cluster launcher")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await conn.send({
+                "op": "request", "id": request_id, "command": command,
+                "args": args or {}, "target": target, "timeout": timeout,
+            })
+            # The hub waits up to `timeout` for the slowest cluster before answering.
+            response = await asyncio.wait_for(future, timeout + 2)
+        except asyncio.TimeoutError:
+            raise IpcError("the cluster launcher did not answer")
+        except ConnectionError as e:
+            raise IpcError(f"connection to the cluster launcher lost: {e}")
+        finally:
+            self._pending.pop(request_id, None)
+        results = {int(cluster_id): result for cluster_id, result in response.get("results", {}).items()}
+        errors = {int(cluster_id): error for cluster_id, error in response.get("errors", {}).items()}
+        return results, errors
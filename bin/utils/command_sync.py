@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+import json
+import os
+
+import discord
+
+
+def tree_fingerprint(tree, guild=None):
+    """Hashes the payload Discord would receive for the tree's commands (global, or one guild's)."""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command.get("type", 1), command["name"]),
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _read_fingerprints(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_fingerprints(path, fingerprints):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(fingerprints, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+class CommandSyncer:
+    """Syncs application commands once per process, and only when they've changed.
+
+    The last synced fingerprint is stored per application and scope, so
+    reconnects and restarts with an unchanged command set cost no API calls.
+    With `guild_id`, global commands are copied to that guild and synced there
+    instead, which takes effect immediately (for staging servers).
+    """
+
+    def __init__(self, tree, path=".command_sync.json", guild_id=None, force=False):
+        self.tree = tree
+        self.path = path
+        self.guild = discord.Object(id=int(guild_id)) if guild_id else None
+        self.force = force
+        self.done = False
+
+    async def sync(self):
+        """Returns the synced commands, or None when nothing changed (or another call already ran)."""
+        if self.done:
+            return None
+        self.done = True
+        try:
+            return await self._sync()
+        except Exception:
+            self.done = False  # Try again on the next on_ready.
+            raise
+
+    async def _sync(self):
+        if self.guild is not None:
+            self.tree.copy_global_to(guild=self.guild)
+        scope = f"{self.tree.client.application_id}:{self.guild.id if self.guild else 'global'}"
+
+        fingerprint = tree_fingerprint(self.tree, guild=self.guild)
+        fingerprints = await asyncio.to_thread(_read_fingerprints, self.path)
+        if not self.force and fingerprints.get(scope) == fingerprint:
+            print(f"Commands unchanged since the last sync ({scope}); skipping sync.")
+            return None
+
+        synced = await self.tree.sync(guild=self.guild)
+        fingerprints[scope] = fingerprint
+        await asyncio.to_thread(_write_fingerprints, self.path, fingerprints)
+        return synced
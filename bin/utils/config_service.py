@@ -0,0 +1,263 @@
+import asyncio
+import functools
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+# Files the cogs used to keep their own settings in, and the section each one becomes.
+LEGACY_FILES = {
+    "welcome": "server_config.json",
+    "music": "music_config.json",
+    "gemini": "gemini_config.json",
+}
+
+
+def _read_json(path):
+    """Returns (data, mtime). Invalid JSON gives no data but still the file's mtime, so it isn't re-read until it changes."""
+    try:
+        mtime = os.path.getmtime(path)
+        with open(path, "r") as f:
+            return json.load(f), mtime
+    except FileNotFoundError:
+        return None, None
+    except json.JSONDecodeError:
+        print(f"Error: {path} contains invalid JSON. Ignoring it.")
+        return None, mtime
+
+
+class JsonBackend:
+    """All guilds in one JSON file, replaced atomically on every flush."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None  # of the version we last read or wrote
+
+    def load(self):
+        data, self.mtime = _read_json(self.path)
+        return data
+
+    def prepare(self, data, dirty):
+        # Serialized on the loop so the snapshot is consistent; only the disk I/O moves off it.
+        return json.dumps(data, indent=4)
+
+    def write(self, payload):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+        self.mtime = os.path.getmtime(self.path)
+
+    def changed_externally(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return False
+        return mtime != self.mtime
+
+    def close(self):
+        pass
+
+
+class SqliteBackend:
+    """One row per guild, so a flush only rewrites the guilds that changed."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._data_version = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS guild_config (guild_id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def load(self):
+        conn = self._connect()
+        rows = conn.execute("SELECT guild_id, data FROM guild_config").fetchall()
+        self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        return {guild_id: json.loads(data) for guild_id, data in rows} if rows else None
+
+    def prepare(self, data, dirty):
+        return [(guild_id, json.dumps(data[guild_id]) if guild_id in data else None) for guild_id in dirty]
+
+    def write(self, payload):
+        conn = self._connect()
+        with conn:
+            for guild_id, data in payload:
+                if data is None:
+                    conn.execute("DELETE FROM guild_config WHERE guild_id = ?", (guild_id,))
+                else:
+                    conn.execute("INSERT OR REPLACE INTO guild_config (guild_id, data) VALUES (?, ?)", (guild_id, data))
+        self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed_externally(self):
+        # data_version only moves when another connection commits.
+        return self._connect().execute("PRAGMA data_version").fetchone()[0] != self._data_version
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class ConfigService:
+    """Per-guild settings for every cog, backed by one file.
+
+    Reads come from memory. Writes mark the guild dirty and are flushed
+    together `flush_delay` seconds later on a dedicated thread, so a burst of
+    settings commands costs one write and never blocks the event loop. Edits
+    made to the file by hand are picked up every `poll_interval` seconds.
+
+    Settings are grouped by guild, then by section ("welcome", "music",
+    "gemini"). On first start the old per-cog JSON files are imported, or
+    `import_path` if given (a file written by the JSON backend, for moving
+    to sqlite).
+
+    Run several processes against one file only with the sqlite backend: it
+    rewrites just the guilds that changed, where the JSON backend would
+    overwrite other processes' guilds with its own copy.
+    """
+
+    def __init__(self, path="bot_config.json", backend="json", flush_delay=1.0, poll_interval=5.0, import_path=None):
+        self.backend = SqliteBackend(path) if backend == "sqlite" else JsonBackend(path)
+        self.import_path = import_path
+        self.flush_delay = flush_delay
+        self.poll_interval = poll_interval
+        self._data = {}  # guild_id (str) -> {section: {key: value}}
+        self._dirty = set()
+        self._flush_task = None
+        self._poll_task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="config")
+        self.flushes = 0
+        self.reloads = 0
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def open(self):
+        data = await self._run(self.backend.load)
+        if data is None:
+            data = await self._run(self._import_legacy, self.import_path)
+            self._dirty.update(data)
+        self._data = data
+        if self._dirty:
+            await self.flush()
+        if self.poll_interval:
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    @staticmethod
+    def _import_legacy(import_path=None):
+        if import_path:
+            data, _ = _read_json(import_path)
+            if data:
+                print(f"Imported {len(data)} guild(s) from {import_path}.")
+                return data
+        data = {}
+        for section, path in LEGACY_FILES.items():
+            legacy, _ = _read_json(path)
+            for guild_id, settings in (legacy or {}).items():
+                data.setdefault(str(guild_id), {})[section] = settings
+            if legacy:
+                print(f"Imported {len(legacy)} guild(s) from {path}.")
+        return data
+
+    def section(self, guild_id, name, create=False):
+        """Returns a guild's settings for one section. Call `mark_dirty` after changing it in place.
+
+        Without `create`, a guild with no settings gets a throwaway empty dict.
+        """
+        guild = self._data.get(str(guild_id))
+        if guild is None:
+            if not create:
+                return {}
+            guild = self._data[str(guild_id)] = {}
+        settings = guild.get(name)
+        if settings is None:
+            if not create:
+                return {}
+            settings = guild[name] = {}
+        return settings
+
+    def get(self, guild_id, name, key, default=None):
+        return self.section(guild_id, name).get(key, default)
+
+    def set(self, guild_id, name, key, value):
+        self.section(guild_id, name, create=True)[key] = value
+        self.mark_dirty(guild_id)
+
+    def pop(self, guild_id, name, key, default=None):
+        settings = self.section(guild_id, name)
+        if key not in settings:
+            return default
+        value = settings.pop(key)
+        self.mark_dirty(guild_id)
+        return value
+
+    def mark_dirty(self, guild_id):
+        self._dirty.add(str(guild_id))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Error saving bot config: {e}")
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        payload = self.backend.prepare(self._data, dirty)
+        try:
+            await self._run(self.backend.write, payload)
+        except BaseException:
+            # Includes cancellation: retry these guilds on the next flush.
+            self._dirty |= dirty
+            raise
+        self.flushes += 1
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if await self._run(self.backend.changed_externally):
+                    await self.reload()
+            except Exception as e:
+                print(f"Error reloading bot config: {e}")
+
+    async def reload(self):
+        """Re-reads the backing file. Guilds with unsaved changes keep them.
+
+        A file that can't be read (e.g. half-written by an editor) leaves the
+        settings in memory as they are, so the next flush can't wipe every
+        other guild from it.
+        """
+        data = await self._run(self.backend.load)
+        if data is None:
+            print("Bot config changed externally but couldn't be read; keeping the current settings.")
+            return
+        for guild_id in self._dirty:
+            if guild_id in self._data:
+                data[guild_id] = self._data[guild_id]
+        self._data = data
+        self.reloads += 1
+        print("Reloaded bot config after an external change.")
+
+    async def close(self):
+        for task in (self._poll_task, self._flush_task):
+            if task is not None:
+                task.cancel()
+        try:
+            await self.flush()
+        finally:
+            await self._run(self.backend.close)
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,160 @@
+import asyncio
+import functools
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from bin.utils import metrics
+from bin.utils.lazy_import import lazy_import
+
+yt_dlp = lazy_import("yt_dlp")
+
+# Lower numbers are served first.
+PRIORITY_INTERACTIVE = 0  # A user is waiting on the answer (/play, starting the next song)
+PRIORITY_PREFETCH = 1  # Lookahead for the next song in the queue
+PRIORITY_BACKGROUND = 2  # Playlist pages, autoplay suggestions
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_PREFETCH: "prefetch", PRIORITY_BACKGROUND: "background"}
+
+_local = threading.local()
+
+JOB_SECONDS = metrics.histogram(
+    "ytdlp_job_seconds", "Time yt-dlp spent on a job once a worker picked it up.", labels=("job", "outcome"),
+    buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0),
+)
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    "ytdlp_queue_wait_seconds", "Time a yt-dlp job waited for a free worker.", labels=("priority",),
+)
+
+
+def _get_ydl(ydl_opts):
+    """Returns this worker's warm YoutubeDL for an option set, creating it on first use."""
+    instances = getattr(_local, "instances", None)
+    if instances is None:
+        instances = _local.instances = {}
+    key = json.dumps(ydl_opts, sort_keys=True, default=str)
+    ydl = instances.get(key)
+    if ydl is None:
+        ydl = instances[key] = yt_dlp.YoutubeDL(ydl_opts)
+    return key, ydl
+
+
+def extract_info(query, ydl_opts, sanitize=False):
+    """Runs inside a pool worker. YoutubeDL isn't thread-safe, so every worker keeps its own instances."""
+    key, ydl = _get_ydl(ydl_opts)
+    try:
+        info = ydl.extract_info(query, download=False)
+    except Exception:
+        # Don't keep an instance around that may have been left in a bad state.
+        _local.instances.pop(key, None)
+        raise
+    # Process workers have to hand back something picklable.
+    return ydl.sanitize_info(info) if sanitize else info
+
+
+class ExtractionPool:
+    """Bounded, priority-ordered executor dedicated to yt-dlp extractions.
+
+    Only `max_workers` jobs are handed to the executor at a time; everything
+    else waits in a priority queue so interactive requests overtake background
+    work instead of queuing behind it in the executor.
+    """
+
+    def __init__(self, mode: str = "thread", max_workers: int = 4):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown extraction pool mode: {mode}")
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self._executor = None
+        self._queue = None
+        self._workers = []
+        self._counter = itertools.count()
+
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def _ensure_started(self):
+        if self._workers:
+            return
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ytdlp")
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    async def extract(self, query, ydl_opts, priority=PRIORITY_INTERACTIVE):
+        return await self.submit(extract_info, query, ydl_opts, self.mode == "process", priority=priority)
+
+    async def submit(self, func, *args, priority=PRIORITY_INTERACTIVE):
+        """Queues a blocking call and waits for its result."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        # The counter keeps equal priorities FIFO and stops tuples from comparing the callables.
+        self._queue.put_nowait((priority, next(self._counter), time.monotonic(), func, args, future))
+        return await future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            priority, _, queued_at, func, args, future = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+
+                started = time.monotonic()
+                wait = started - queued_at
+                self.last_wait = wait
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                QUEUE_WAIT_SECONDS.observe(wait, priority=PRIORITY_NAMES.get(priority, priority))
+
+                self.in_flight += 1
+                outcome = "error"
+                try:
+                    result = await loop.run_in_executor(self._executor, functools.partial(func, *args))
+                except Exception as e:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.completed += 1
+                    outcome = "ok"
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self.in_flight -= 1
+                    JOB_SECONDS.observe(time.monotonic() - started, job=func.__name__, outcome=outcome)
+            finally:
+                self._queue.task_done()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait": self.total_wait / finished if finished else 0.0,
+            "max_wait": self.max_wait,
+            "last_wait": self.last_wait,
+        }
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,178 @@
+import asyncio
+import contextlib
+import math
+import time
+from collections import deque
+
+REASON_RATE_LIMITED = "rate_limited"
+REASON_QUEUE_FULL = "queue_full"
+
+
+class SchedulerBusy(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class FairScheduler:
+    """Admits API requests fairly across guilds, with backpressure.
+
+    Each guild has a token bucket (`rate` requests per second, bursts up to
+    `burst`); requests beyond it are refused immediately. Admitted requests
+    wait in per-guild queues served by deficit round-robin, so a guild with a
+    long queue gets its weighted share of the `max_concurrent` slots and no
+    more. Once `max_queue` requests are waiting, new ones are refused instead
+    of queueing behind a backlog they would time out in.
+    """
+
+    def __init__(self, max_concurrent=4, max_queue=50, rate=20 / 60, burst=5, weights=None):
+        for guild_id, weight in (weights or {}).items():
+            if not (math.isfinite(weight) and weight > 0):
+                raise ValueError(f"Guild {guild_id} has weight {weight}; weights must be positive numbers.")
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.rate = rate
+        self.burst = burst
+        self.weights = dict(weights or {})  # guild_id -> share of slots relative to 1.0
+        self._buckets = {}  # guild_id -> TokenBucket
+        self._queues = {}  # guild_id -> deque of (future, enqueued_at)
+        self._deficits = {}  # guild_id -> admissions still owed this round
+        self._active = deque()  # guilds with waiting requests, in round-robin order
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.dropped = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _bucket(self, guild_id):
+        bucket = self._buckets.get(guild_id)
+        if bucket is None:
+            bucket = self._buckets[guild_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _admit(self, waited):
+        self.in_flight += 1
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    async def acquire(self, guild_id):
+        """Waits for a slot. Raises SchedulerBusy when the guild is over its rate or the queue is full."""
+        bucket = self._bucket(guild_id)
+        if not bucket.take():
+            self.rate_limited += 1
+            raise SchedulerBusy(REASON_RATE_LIMITED)
+
+        if self.in_flight < self.max_concurrent and not self.waiting:
+            self._admit(0.0)
+            return
+        if self.waiting >= self.max_queue:
+            bucket.refund()
+            self.dropped += 1
+            raise SchedulerBusy(REASON_QUEUE_FULL)
+
+        entry = (asyncio.get_running_loop().create_future(), time.monotonic())
+        queue = self._queues.get(guild_id)
+        if queue is None:
+            queue = self._queues[guild_id] = deque()
+            self._active.append(guild_id)
+        queue.append(entry)
+        self.waiting += 1
+        try:
+            await entry[0]
+        except asyncio.CancelledError:
+            if entry[0].done() and not entry[0].cancelled():
+                self.release()  # Admitted just as we were cancelled.
+            elif entry in queue:
+                queue.remove(entry)
+                self.waiting -= 1
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        idle_turns = 0  # guild turns in a row that admitted nothing
+        while self.in_flight < self.max_concurrent and self._active:
+            if idle_turns >= len(self._active):
+                # A whole round admitted nothing, so every weight is below 1. Credit the idle rounds it
+                # takes for the first guild to reach a full admission, instead of spinning through them;
+                # the next round then admits it.
+                rounds = min(
+                    math.ceil((1 - self._deficits.get(guild_id, 0.0)) / self.weights.get(guild_id, 1.0))
+                    for guild_id in self._active
+                )
+                for guild_id in self._active:
+                    self._deficits[guild_id] = (
+                        self._deficits.get(guild_id, 0.0) + max(rounds - 1, 0) * self.weights.get(guild_id, 1.0)
+                    )
+                idle_turns = 0
+
+            guild_id = self._active[0]
+            queue = self._queues[guild_id]
+            if self._deficits.get(guild_id, 0.0) < 1:
+                self._deficits[guild_id] = self._deficits.get(guild_id, 0.0) + self.weights.get(guild_id, 1.0)
+
+            idle_turns += 1
+            while queue and self._deficits[guild_id] >= 1 and self.in_flight < self.max_concurrent:
+                future, enqueued_at = queue.popleft()
+                self.waiting -= 1
+                if future.done():
+                    # Cancelled, but its waiter hasn't run its cleanup yet; it costs no turn.
+                    continue
+                self._deficits[guild_id] -= 1
+                self._admit(time.monotonic() - enqueued_at)
+                future.set_result(None)
+                idle_turns = 0
+
+            if not queue:
+                self._active.popleft()
+                del self._queues[guild_id]
+                self._deficits.pop(guild_id, None)
+            elif self._deficits[guild_id] < 1:
+                self._active.rotate(-1)
+            # Otherwise we ran out of slots mid-turn; this guild keeps its place and deficit.
+
+    @contextlib.asynccontextmanager
+    async def slot(self, guild_id):
+        await self.acquire(guild_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        return {
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "avg_wait": self.total_wait / self.admitted if self.admitted else 0.0,
+            "max_wait": self.max_wait,
+            "rate_limited": self.rate_limited,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,180 @@
+import asyncio
+import contextlib
+import time
+from bin.utils import metrics
+
+REQUEST_SECONDS = metrics.histogram(
+    "gemini_request_seconds", "Time from admission to the end of a Gemini response.", labels=("kind",),
+)
+REQUESTS = metrics.counter(
+    "gemini_requests_total", "Gemini requests by outcome (ok, timeout, error or cancelled).", labels=("kind", "outcome"),
+)
+
+
+class GeminiTimeout(Exception):
+    pass
+
+
+@contextlib.asynccontextmanager
+async def _no_slot():
+    yield
+
+
+class GeminiClient:
+    """Async access to a Gemini model with global and per-guild concurrency caps.
+
+    Requests go through `generate_content_async`, so the event loop (and with
+    it voice heartbeats and every other cog) keeps running while Gemini works.
+    At most `max_concurrent` requests are in flight overall and at most
+    `per_guild` for any one guild, so a single busy server can't starve the rest.
+    With a `scheduler` (a FairScheduler), requests are also admitted by it,
+    which may refuse them with SchedulerBusy. The guild cap is taken first, so
+    a request never holds a scheduler slot while waiting on its own guild.
+    Background requests (conversation summaries) skip both the guild cap and
+    the scheduler, so they don't spend a guild's budget; at most
+    `max_background` run at once, and callers check `busy` to stay out of
+    the way of queued replies.
+
+    The model comes from `model_factory`, called on a worker thread before
+    the first request, so the Gemini SDK isn't imported until it's needed.
+    """
+
+    def __init__(self, model_factory, max_concurrent=4, per_guild=2, timeout=30.0, scheduler=None, max_background=1):
+        self.model_factory = model_factory
+        self.model = None
+        self._model_lock = asyncio.Lock()
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self.per_guild = per_guild
+        self._global_limit = asyncio.Semaphore(max_concurrent)
+        self._background_limit = asyncio.Semaphore(max_background)
+        self._guild_limits = {}  # guild_id -> [Semaphore, requests holding or waiting on it]
+        self.in_flight = 0
+        self.requests = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.streams = 0
+        self.total_first_chunk = 0.0
+
+    async def get_model(self):
+        if self.model is None:
+            async with self._model_lock:
+                if self.model is None:
+                    self.model = await asyncio.to_thread(self.model_factory)
+        return self.model
+
+    @contextlib.asynccontextmanager
+    async def _guild_limit(self, guild_id):
+        # Entries only live while a request uses them, so guilds that went quiet cost nothing.
+        entry = self._guild_limits.get(guild_id)
+        if entry is None:
+            entry = self._guild_limits[guild_id] = [asyncio.Semaphore(self.per_guild), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._guild_limits[guild_id]
+
+    def _slot(self, guild_id):
+        return self.scheduler.slot(guild_id) if self.scheduler is not None else _no_slot()
+
+    @contextlib.asynccontextmanager
+    async def _admission(self, guild_id, background=False):
+        if background:
+            async with self._background_limit, self._global_limit:
+                yield
+        else:
+            async with self._guild_limit(guild_id), self._slot(guild_id), self._global_limit:
+                yield
+
+    @property
+    def busy(self):
+        """True while replies are waiting for a slot; background work should wait for a quieter moment."""
+        return self._global_limit.locked() or (self.scheduler is not None and self.scheduler.waiting > 0)
+
+    async def generate(self, contents, guild_id=None, generation_config=None, background=False):
+        """Returns the model's response. Raises GeminiTimeout if it takes longer than `timeout`.
+
+        `background` requests aren't charged to `guild_id`; see the class docstring.
+        """
+        model = await self.get_model()
+        async with self._admission(guild_id, background):
+            self.in_flight += 1
+            started = time.monotonic()
+            outcome = "cancelled"
+            try:
+                response = await asyncio.wait_for(
+                    model.generate_content_async(contents=contents, generation_config=generation_config),
+                    timeout=self.timeout,
+                )
+                outcome = "ok"
+                return response
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                outcome = "timeout"
+                raise GeminiTimeout(f"Gemini did not answer within {self.timeout:g}s")
+            except Exception:
+                self.errors += 1
+                outcome = "error"
+                raise
+            finally:
+                self._finished("generate", outcome, time.monotonic() - started)
+
+    async def stream(self, contents, guild_id=None, generation_config=None):
+        """Yields the response text chunk by chunk. `timeout` bounds the wait for each chunk."""
+        model = await self.get_model()
+        async with self._admission(guild_id):
+            self.in_flight += 1
+            started = time.monotonic()
+            first_chunk = True
+            outcome = "cancelled"  # Also when the caller stops reading early
+            try:
+                response = await asyncio.wait_for(
+                    model.generate_content_async(
+                        contents=contents, generation_config=generation_config, stream=True
+                    ),
+                    timeout=self.timeout,
+                )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    if first_chunk:
+                        first_chunk = False
+                        self.streams += 1
+                        self.total_first_chunk += time.monotonic() - started
+                    yield chunk.text
+                outcome = "ok"
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                outcome = "timeout"
+                raise GeminiTimeout(f"Gemini stopped answering for {self.timeout:g}s")
+            except Exception:
+                self.errors += 1
+                outcome = "error"
+                raise
+            finally:
+                self._finished("stream", outcome, time.monotonic() - started)
+
+    def _finished(self, kind, outcome, elapsed):
+        self.in_flight -= 1
+        self.requests += 1
+        self.total_latency += elapsed
+        REQUEST_SECONDS.observe(elapsed, kind=kind)
+        REQUESTS.inc(kind=kind, outcome=outcome)
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "avg_latency": self.total_latency / self.requests if self.requests else 0.0,
+            "avg_first_chunk": self.total_first_chunk / self.streams if self.streams else 0.0,
+        }
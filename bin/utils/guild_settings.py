@@ -0,0 +1,24 @@
+import discord
+
+
+def migrate_names_to_ids(settings, guild, fields):
+    """Replaces legacy name-based entries in one guild's settings with IDs.
+
+    `fields` maps a legacy key to (new key, guild attribute to search), e.g.
+    {"welcome_role_name": ("welcome_role_id", "roles")}. Returns True if the
+    settings changed. Names that don't match anything are kept, so the
+    migration can be retried once the channel or role exists again.
+    """
+    changed = False
+    for name_key, (id_key, collection) in fields.items():
+        name = settings.get(name_key)
+        if name is None:
+            continue
+        if id_key not in settings:
+            match = discord.utils.get(getattr(guild, collection), name=name)
+            if match is None:
+                continue
+            settings[id_key] = match.id
+        del settings[name_key]
+        changed = True
+    return changed
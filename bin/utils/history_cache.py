@@ -0,0 +1,101 @@
+import time
+from collections import deque
+
+
+class ChannelHistory:
+    __slots__ = ('entries', 'last_active', 'warm')
+
+    def __init__(self, maxlen):
+        self.entries = deque(maxlen=maxlen)  # (message_id, turn), oldest first
+        self.last_active = time.monotonic()
+        self.warm = False  # True once the backlog before we started listening has been fetched
+
+
+class HistoryCache:
+    """Recent messages per channel, already preprocessed into prompt turns.
+
+    A channel's buffer is seeded with one REST fetch the first time the bot is
+    mentioned there; from then on it is kept current by the message, edit and
+    delete events, so answering a mention needs no network round-trip.
+    Channels nobody has written in for `idle_ttl` seconds are dropped.
+    """
+
+    def __init__(self, preprocess, maxlen=20, idle_ttl=1800.0):
+        self.preprocess = preprocess  # discord.Message -> turn dict
+        self.maxlen = maxlen
+        self.idle_ttl = idle_ttl
+        self.channels = {}  # channel_id -> ChannelHistory
+        self.hits = 0
+        self.cold_fetches = 0
+
+    def _insert(self, history, message_id, turn):
+        if history.entries and history.entries[-1][0] > message_id:
+            # Arrived out of order (e.g. during the cold fetch); keep the buffer sorted.
+            entries = sorted([entry for entry in history.entries if entry[0] != message_id] + [(message_id, turn)],
+                             key=lambda entry: entry[0])
+            history.entries.clear()
+            history.entries.extend(entries[-history.entries.maxlen:])
+        else:
+            history.entries.append((message_id, turn))
+
+    def add(self, message):
+        """Records a new message if its channel is being tracked."""
+        history = self.channels.get(message.channel.id)
+        if history is None:
+            return
+        self._insert(history, message.id, self.preprocess(message))
+        history.last_active = time.monotonic()
+
+    def edit(self, message):
+        history = self.channels.get(message.channel.id)
+        if history is None:
+            return
+        for i, (message_id, _) in enumerate(history.entries):
+            if message_id == message.id:
+                history.entries[i] = (message_id, self.preprocess(message))
+                return
+
+    def delete(self, channel_id, message_id):
+        history = self.channels.get(channel_id)
+        if history is None:
+            return
+        for entry in history.entries:
+            if entry[0] == message_id:
+                history.entries.remove(entry)
+                return
+
+    async def before(self, message):
+        """Returns the turns preceding `message`, oldest first, fetching from Discord only on a cold start.
+
+        Propagates discord.Forbidden and other fetch errors from the cold start.
+        """
+        self.purge_idle()
+        history = self.channels.get(message.channel.id)
+        if history is None:
+            # Start listening before the fetch so messages sent meanwhile aren't lost.
+            # One extra slot so the mention itself doesn't push out a turn of its own context.
+            history = self.channels[message.channel.id] = ChannelHistory(self.maxlen + 1)
+        history.last_active = time.monotonic()
+
+        if not history.warm:
+            self.cold_fetches += 1
+            try:
+                async for msg in message.channel.history(limit=self.maxlen, before=message):
+                    self._insert(history, msg.id, self.preprocess(msg))
+            except Exception:
+                self.channels.pop(message.channel.id, None)
+                raise
+            self._insert(history, message.id, self.preprocess(message))
+            history.warm = True
+        else:
+            self.hits += 1
+
+        return [turn for message_id, turn in history.entries if message_id < message.id]
+
+    def purge_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        for channel_id in [cid for cid, history in self.channels.items() if history.last_active < cutoff]:
+            del self.channels[channel_id]
+
+    def stats(self):
+        return {"channels": len(self.channels), "hits": self.hits, "cold_fetches": self.cold_fetches}
@@ -0,0 +1,159 @@
+import asyncio
+import base64
+import hashlib
+import io
+from collections import OrderedDict
+
+import aiohttp
+import filetype
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it images are sent at their original size.
+    Image = None
+
+DOWNSCALE_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+class EncodedImage:
+    __slots__ = ('mime_type', 'data', 'digest')
+
+    def __init__(self, mime_type, data, digest):
+        self.mime_type = mime_type
+        self.data = data  # base64 text, ready for an inline_data part
+        self.digest = digest  # sha256 of the downloaded bytes, so re-uploads of one image match
+
+    def as_part(self):
+        return {"inline_data": {"mime_type": self.mime_type, "data": self.data}}
+
+
+def _encode(raw, content_type, max_dimension):
+    """Runs in a worker thread: downscales oversized images and base64-encodes the result."""
+    digest = hashlib.sha256(raw).hexdigest()
+    kind = filetype.guess(raw)
+    mime_type = kind.mime if kind else (content_type or "image/png")
+
+    if Image is not None and max_dimension:
+        try:
+            with Image.open(io.BytesIO(raw)) as image:
+                if image.format in DOWNSCALE_FORMATS and max(image.size) > max_dimension:
+                    image.thumbnail((max_dimension, max_dimension))
+                    output = io.BytesIO()
+                    if image.mode in ("RGBA", "LA", "P"):
+                        image.save(output, format="PNG", optimize=True)
+                        mime_type = "image/png"
+                    else:
+                        image.convert("RGB").save(output, format="JPEG", quality=85)
+                        mime_type = "image/jpeg"
+                    raw = output.getvalue()
+        except Exception:
+            pass  # Not something Pillow understands; send it as-is.
+
+    return EncodedImage(mime_type, base64.b64encode(raw).decode(), digest)
+
+
+class ImageFetcher:
+    """Downloads image attachments for Gemini over a pooled aiohttp session.
+
+    Downloads are capped at `max_bytes` and `timeout` seconds, images larger
+    than `max_dimension` pixels are shrunk (when Pillow is installed), and the
+    encoded payloads are kept in an LRU keyed by attachment ID, so an image
+    that stays in the conversation is only fetched once.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, timeout=10.0, max_dimension=1536, cache_size=128):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_dimension = max_dimension
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # attachment_id -> EncodedImage
+        self._pending = {}  # attachment_id -> Future, so concurrent mentions share a download
+        self._session = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=16, ttl_dns_cache=300),
+            )
+        return self._session
+
+    async def fetch(self, attachment_id, url):
+        """Returns the EncodedImage for an attachment. Raises ImageFetchError if it can't be used."""
+        cached = self._cache.get(attachment_id)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(attachment_id)
+            return cached
+
+        pending = self._pending.get(attachment_id)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = self._pending[attachment_id] = asyncio.get_running_loop().create_future()
+        try:
+            raw, content_type = await self._download(url)
+            image = await asyncio.to_thread(_encode, raw, content_type, self.max_dimension)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            # Every failure has to reach the mentions awaiting this future, not just ImageFetchError.
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved; our own caller gets it re-raised.
+            raise
+        else:
+            future.set_result(image)
+            self._cache[attachment_id] = image
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return image
+        finally:
+            self._pending.pop(attachment_id, None)
+
+    async def fetch_many(self, attachments):
+        """Fetches (attachment_id, url) pairs in parallel. Returns the images that could be used, in order."""
+        results = await asyncio.gather(*(self.fetch(a_id, url) for a_id, url in attachments), return_exceptions=True)
+        images = []
+        for result in results:
+            if isinstance(result, ImageFetchError):
+                raise result
+            if isinstance(result, BaseException):
+                raise ImageFetchError(str(result)) from result
+            images.append(result)
+        return images
+
+    async def _download(self, url):
+        try:
+            async with self._get_session().get(url) as response:
+                response.raise_for_status()
+                if response.content_length and response.content_length > self.max_bytes:
+                    raise ImageFetchError("Image is too large.")
+                chunks = []
+                size = 0
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageFetchError("Image is too large.")
+                    chunks.append(chunk)
+                return b"".join(chunks), response.content_type
+        except asyncio.TimeoutError:
+            raise ImageFetchError("Timed out downloading the image.")
+        except aiohttp.ClientError as e:
+            raise ImageFetchError(f"Could not download the image: {e}")
+
+    def stats(self):
+        return {"cached": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
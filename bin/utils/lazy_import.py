@@ -0,0 +1,64 @@
+import asyncio
+import importlib
+import os
+import threading
+import time
+
+# Set BOT_LAZY_IMPORTS=0 to import heavy dependencies up front like before.
+LAZY_IMPORTS = os.getenv("BOT_LAZY_IMPORTS", "1").lower() not in ("0", "false", "no")
+
+_registry = []  # every LazyModule created, in creation order
+_observer = None  # called as observer(description, seconds) after each deferred import
+
+
+def observe(callback):
+    """Reports how long each deferred import took, e.g. to a StartupProfile's `record`."""
+    global _observer
+    _observer = callback
+
+
+class LazyModule:
+    """Stands in for a module and imports it the first time an attribute is used."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if _observer is not None:
+                        _observer(f"import {self._name} ({threading.current_thread().name})",
+                                  time.perf_counter() - start)
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name):
+    """Returns `name` as a LazyModule, or the real module when lazy imports are turned off."""
+    if not LAZY_IMPORTS:
+        return importlib.import_module(name)
+    module = LazyModule(name)
+    _registry.append(module)
+    return module
+
+
+async def warm_up():
+    """Imports every deferred module on a worker thread so first use doesn't stall the event loop."""
+    for module in _registry:
+        if not module.loaded:
+            try:
+                await asyncio.to_thread(module._load)
+            except ImportError as e:
+                print(f"Could not import {module._name}: {e}")
@@ -0,0 +1,111 @@
+import re
+
+# "@" that doesn't follow a word character, so e-mail addresses like foo@example.com are left alone.
+MENTION_START = re.compile(r"(?<!\w)@")
+MAX_NAME_LENGTH = 37  # 32-character names, plus "#1234" for legacy tags
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+def _alias_keys(member):
+    """Casefolded names other than the username that a reply might use: display name and legacy tag."""
+    keys = {member.display_name.casefold()}
+    discriminator = getattr(member, "discriminator", "0")
+    if discriminator and discriminator != "0":
+        keys.add(f"{member.name}#{discriminator}".casefold())
+    return keys
+
+
+class GuildNames:
+    __slots__ = ('ids', 'aliases', 'complete')
+
+    def __init__(self):
+        self.ids = {}  # casefolded username -> member ID
+        self.aliases = {}  # casefolded display name or legacy name#1234 -> member ID
+        self.complete = False  # built from a fully chunked member list
+
+    def add(self, member):
+        self.ids[member.name.casefold()] = member.id
+        for key in _alias_keys(member):
+            self.aliases.setdefault(key, member.id)
+
+    def remove(self, member):
+        key = member.name.casefold()
+        if self.ids.get(key) == member.id:
+            del self.ids[key]
+        for key in _alias_keys(member):
+            if self.aliases.get(key) == member.id:
+                del self.aliases[key]
+
+    def get(self, key):
+        member_id = self.ids.get(key)
+        return member_id if member_id is not None else self.aliases.get(key)
+
+
+class MemberIndex:
+    """Per-guild name -> member ID lookup for turning "@name" in replies into real mentions.
+
+    A guild's index is built from `guild.members` the first time it's needed
+    and then kept current by member join/leave/update events, so rewriting a
+    reply costs a few dict lookups per "@" instead of a scan per member.
+    Usernames win over display names and legacy "name#1234" tags, which may
+    contain spaces and any other characters.
+    """
+
+    def __init__(self):
+        self.guilds = {}  # guild_id -> GuildNames
+
+    def _names(self, guild):
+        names = self.guilds.get(guild.id)
+        if names is None or (not names.complete and guild.chunked):
+            names = self.guilds[guild.id] = GuildNames()
+            for member in guild.members:
+                names.add(member)
+            names.complete = guild.chunked
+        return names
+
+    def add(self, member):
+        names = self.guilds.get(member.guild.id)
+        if names is not None:
+            names.add(member)
+
+    def remove(self, member):
+        names = self.guilds.get(member.guild.id)
+        if names is not None:
+            names.remove(member)
+
+    def rename(self, before, after):
+        """Handles a username (on_user_update) or nickname (on_member_update) change."""
+        guild = getattr(after, "guild", None)
+        indexes = [self.guilds.get(guild.id)] if guild is not None else list(self.guilds.values())
+        for names in indexes:
+            if names is not None and names.ids.get(before.name.casefold()) == after.id:
+                names.remove(before)
+                names.add(after)
+
+    def forget(self, guild_id):
+        self.guilds.pop(guild_id, None)
+
+    def rewrite(self, guild, text):
+        """Replaces "@name" with a mention of the guild member of that name, preferring the longest match."""
+        names = self._names(guild)
+        parts = []
+        done = 0
+        for match in MENTION_START.finditer(text):
+            start = match.end()
+            if match.start() < done:
+                continue
+            for end in range(min(len(text), start + MAX_NAME_LENGTH), start, -1):
+                # Don't match "@Bob" inside "@Bobby".
+                if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+                    continue
+                member_id = names.get(text[start:end].casefold())
+                if member_id is not None:
+                    parts.append(text[done:match.start()])
+                    parts.append(f"<@{member_id}>")
+                    done = end
+                    break
+        parts.append(text[done:])
+        return "".join(parts)
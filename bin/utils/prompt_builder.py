@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # Gemini's rough average for English text
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def format_turn(turn):
+    """Renders a history turn as one prompt line and stores it (and its cost) on the turn."""
+    line = turn.get('line')
+    if line is None:
+        timestamp_str = turn['timestamp'].strftime("%Y-%m-%d %H:%M:%S UTC")
+        image_marker = " [Image Attached]" if turn.get('image_url') else ""
+        line = turn['line'] = f"{turn['author']} ({timestamp_str}):{image_marker} {turn['text']}"
+        turn['tokens'] = estimate_tokens(line)
+    return line
+
+
+def select_turns(history, budget):
+    """Fills `budget` tokens with the newest turns. Returns (kept, omitted), both oldest first."""
+    kept = []
+    used = 0
+    for i in range(len(history) - 1, -1, -1):
+        turn = history[i]
+        format_turn(turn)
+        if used + turn['tokens'] > budget:
+            return kept[::-1], history[:i + 1]
+        used += turn['tokens']
+        kept.append(turn)
+    return kept[::-1], []
+
+
+def build_prompt(history, persona, instructions, user_input, has_images=False, budget=2000, summary=None):
+    """Assembles the prompt within `budget` tokens. Returns (prompt, omitted turns).
+
+    Turns that don't fit are replaced by `summary`, the rolling summary of
+    the channel's earlier conversation, when there is one.
+    """
+    tail = f"{persona} {instructions} User input: '{user_input}'"
+    if has_images:
+        tail += "\n\nThere is an image attached to this message. Please analyze the image and incorporate your analysis into your response."
+
+    history_budget = budget - estimate_tokens(tail)
+    summary_text = f"Summary of earlier conversation: {summary}\n" if summary else ""
+    if summary_text:
+        history_budget -= estimate_tokens(summary_text)
+    kept, omitted = select_turns(history or [], history_budget)
+
+    parts = []
+    # The summary matters most when nothing else fits, so it goes in whenever turns were omitted.
+    if kept or (omitted and summary_text):
+        parts.append("Conversation History:\n")
+        if omitted and summary_text:
+            parts.append(summary_text)
+        parts.extend(f"{turn['line']}\n" for turn in kept)
+        parts.append("\n")
+    parts.append(tail)
+    return "".join(parts), omitted
+
+
+class ChannelSummary:
+    __slots__ = ('text', 'covered_until', 'task')
+
+    def __init__(self):
+        self.text = None
+        self.covered_until = None  # timestamp of the newest turn folded into the summary
+        self.task = None
+
+
+class ConversationSummaries:
+    """Rolling per-channel summaries of the turns that no longer fit in the prompt.
+
+    Requests only ever read the current summary; folding newly omitted turns
+    into it happens in a background task, so summarizing never adds latency
+    to a reply. Summaries are background requests, not charged to the guild,
+    and are skipped while replies are waiting; the next reply retries them.
+    """
+
+    def __init__(self, client, max_channels=1000, max_output_tokens=150):
+        self.client = client
+        self.max_channels = max_channels
+        self.max_output_tokens = max_output_tokens
+        self._summaries = OrderedDict()  # channel_id -> ChannelSummary
+        self.refreshes = 0
+
+    def get(self, channel_id):
+        summary = self._summaries.get(channel_id)
+        return summary.text if summary is not None else None
+
+    def schedule_refresh(self, channel_id, omitted, generation_config=None):
+        """Folds omitted turns the summary doesn't cover yet into it, in the background."""
+        summary = self._summaries.get(channel_id)
+        if summary is None:
+            summary = self._summaries[channel_id] = ChannelSummary()
+            while len(self._summaries) > self.max_channels:
+                _, dropped = self._summaries.popitem(last=False)
+                if dropped.task is not None:
+                    dropped.task.cancel()
+        self._summaries.move_to_end(channel_id)
+
+        new_turns = [t for t in omitted if summary.covered_until is None or t['timestamp'] > summary.covered_until]
+        if not new_turns or self.client.busy or (summary.task is not None and not summary.task.done()):
+            return
+        summary.task = asyncio.create_task(self._refresh(summary, new_turns, generation_config))
+
+    async def _refresh(self, summary, new_turns, generation_config):
+        prompt = (
+            "Summarize this Discord conversation in under 100 words. Keep who said what, names, "
+            "and any open questions.\n\n"
+        )
+        if summary.text:
+            prompt += f"Summary so far: {summary.text}\n\nNewer messages:\n"
+        prompt += "".join(f"{format_turn(turn)}\n" for turn in new_turns)
+        try:
+            response = await self.client.generate([{"text": prompt}], generation_config=generation_config,
+                                                  background=True)
+            summary.text = response.text.strip()
+            summary.covered_until = new_turns[-1]['timestamp']
+            self.refreshes += 1
+        except Exception as e:
+            logger.warning(f"Could not refresh conversation summary: {e}")
+
+    def stats(self):
+        return {"channels": len(self._summaries), "refreshes": self.refreshes}
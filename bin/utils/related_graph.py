@@ -0,0 +1,136 @@
+import json
+import time
+from collections import OrderedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS related_tracks (
+    video_id TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    related TEXT NOT NULL
+);
+"""
+
+
+class RelatedTrack:
+    __slots__ = ('video_id', 'url', 'title', 'duration')
+
+    def __init__(self, video_id, url, title, duration=None):
+        self.video_id = video_id
+        self.url = url
+        self.title = title
+        self.duration = duration
+
+    @classmethod
+    def from_info(cls, info):
+        video_id = info.get('id')
+        url = info.get('webpage_url') or info.get('url')
+        if not url and video_id:
+            url = f"https://www.youtube.com/watch?v={video_id}"
+        if not url:
+            return None
+        return cls(video_id, url, info.get('title', 'Untitled'), info.get('duration'))
+
+
+class RelatedNode:
+    __slots__ = ('fetched_at', 'related')
+
+    def __init__(self, fetched_at, related):
+        self.fetched_at = fetched_at
+        self.related = related  # list of RelatedTrack, best match first
+
+
+class RelatedGraph:
+    """Related-track adjacency lists keyed by video ID, for autoplay.
+
+    Nodes are filled lazily from extractions we already run, kept in an
+    in-memory LRU and persisted to the music state database, so picking the
+    next autoplay song is a dictionary lookup rather than a yt-dlp call.
+    """
+
+    def __init__(self, store, max_age=7 * 24 * 3600, max_nodes=5000):
+        self.store = store
+        self.max_age = max_age
+        self.max_nodes = max_nodes
+        self._nodes = OrderedDict()  # video_id -> RelatedNode
+        self.hits = 0
+        self.misses = 0
+
+    async def open(self):
+        await self.store.execute(lambda conn: conn.executescript(SCHEMA))
+
+    def __contains__(self, video_id):
+        """Whether the node is in memory (doesn't check the database)."""
+        return video_id in self._nodes
+
+    def _remember(self, video_id, node):
+        self._nodes[video_id] = node
+        self._nodes.move_to_end(video_id)
+        while len(self._nodes) > self.max_nodes:
+            self._nodes.popitem(last=False)
+
+    async def get(self, video_id):
+        """Returns the node for a video from memory or disk, or None if we've never seen its neighbours."""
+        if not video_id:
+            return None
+        node = self._nodes.get(video_id)
+        if node is None:
+            row = await self.store.execute(
+                lambda conn: conn.execute(
+                    "SELECT fetched_at, related FROM related_tracks WHERE video_id = ?", (video_id,)
+                ).fetchone()
+            )
+            if row is not None:
+                related = [RelatedTrack(*values) for values in json.loads(row[1])]
+                node = RelatedNode(row[0], related)
+        if node is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(video_id, node)
+        return node
+
+    def is_stale(self, node):
+        return time.time() - node.fetched_at > self.max_age
+
+    async def record(self, video_id, related_infos):
+        """Stores the related videos yt-dlp reported for `video_id`."""
+        related = [track for track in map(RelatedTrack.from_info, related_infos or []) if track is not None]
+        if not video_id or not related:
+            return
+        node = RelatedNode(time.time(), related)
+        self._remember(video_id, node)
+        payload = json.dumps([[t.video_id, t.url, t.title, t.duration] for t in related])
+        await self.store.execute(
+            lambda conn: conn.execute(
+                "INSERT OR REPLACE INTO related_tracks (video_id, fetched_at, related) VALUES (?, ?, ?)",
+                (video_id, node.fetched_at, payload),
+            )
+        )
+
+    async def pick(self, video_id, exclude, count=3):
+        """Chooses up to `count` related tracks not in `exclude`, looking one hop further if needed."""
+        node = await self.get(video_id)
+        if node is None:
+            return [], None
+
+        picks = []
+        seen = set(exclude)
+        frontier = [node]
+        for depth in range(2):
+            next_frontier = []
+            for current in frontier:
+                for track in current.related:
+                    if track.video_id in seen:
+                        # Still worth walking through: its neighbours may be fresh.
+                        if depth == 0 and track.video_id in self._nodes:
+                            next_frontier.append(self._nodes[track.video_id])
+                        continue
+                    seen.add(track.video_id)
+                    picks.append(track)
+                    if len(picks) >= count:
+                        return picks, node
+            frontier = next_frontier
+        return picks, node
+
+    def stats(self):
+        return {"nodes_in_memory": len(self._nodes), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,97 @@
+import json
+import time
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from bin.utils.ttl_cache import TTLCache
+
+# Options that only change yt-dlp's console output, not what it resolves.
+_COSMETIC_OPTIONS = {"quiet", "no_warnings", "verbose", "logger", "progress_hooks", "noprogress"}
+# Share/tracking parameters that YouTube appends to otherwise identical links.
+_TRACKING_PARAMS = {"si", "feature", "pp", "utm_source", "utm_medium", "utm_campaign"}
+
+
+def normalize_query(query: str) -> str:
+    """Normalizes a search query or URL so equivalent requests share a cache entry."""
+    query = " ".join(query.split())
+    if "://" not in query:
+        # "ytsearch:Song Name" and "ytsearch:song  name" return the same results.
+        prefix, sep, terms = query.partition(":")
+        if sep and prefix.startswith("ytsearch"):
+            return f"{prefix.lower()}:{terms.lower()}"
+        return query.lower()
+
+    parts = urlsplit(query)
+    params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in _TRACKING_PARAMS]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(params), ""))
+
+
+def options_fingerprint(ydl_opts: dict) -> str:
+    relevant = {k: v for k, v in ydl_opts.items() if k not in _COSMETIC_OPTIONS}
+    return json.dumps(relevant, sort_keys=True, default=str)
+
+
+def _first_stream_url(results: dict) -> Optional[str]:
+    if results.get("url"):
+        return results["url"]
+    for entry in results.get("entries") or []:
+        if entry and entry.get("url"):
+            return entry["url"]
+    return None
+
+
+def stream_url_expiry(url: Optional[str]) -> Optional[float]:
+    """Returns the unix time a signed stream URL stops working (googlevideo's `expire=`), if present."""
+    if not url:
+        return None
+    for key, value in parse_qsl(urlsplit(url).query):
+        if key == "expire" and value.isdigit():
+            return float(value)
+    # Some manifests carry the parameter in the path instead: .../expire/1712345678/...
+    segments = urlsplit(url).path.split("/")
+    for i, segment in enumerate(segments[:-1]):
+        if segment == "expire" and segments[i + 1].isdigit():
+            return float(segments[i + 1])
+    return None
+
+
+class ResolutionCache:
+    """Caches yt-dlp `extract_info` results keyed by normalized query and options.
+
+    Entries that contain a signed stream URL live until shortly before that URL
+    expires; flat results (titles, page URLs) use `default_ttl`. Cached result
+    dicts are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, maxsize: int = 512, default_ttl: float = 3600.0, expiry_margin: float = 300.0):
+        self.expiry_margin = expiry_margin
+        self._cache = TTLCache(maxsize=maxsize, default_ttl=default_ttl)
+
+    @staticmethod
+    def make_key(query: str, ydl_opts: dict) -> tuple:
+        return normalize_query(query), options_fingerprint(ydl_opts)
+
+    def get(self, query: str, ydl_opts: dict) -> Optional[dict]:
+        return self._cache.get(self.make_key(query, ydl_opts))
+
+    def set(self, query: str, ydl_opts: dict, results: dict):
+        if not results:
+            return
+        self._cache.set(self.make_key(query, ydl_opts), results, ttl=self.ttl_for(results))
+
+    def ttl_for(self, results: dict) -> float:
+        expires_at = stream_url_expiry(_first_stream_url(results))
+        if expires_at is None:
+            return self._cache.default_ttl
+        return min(expires_at - time.time() - self.expiry_margin, self._cache.default_ttl * 6)
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+    def stats(self) -> dict:
+        return self._cache.stats()
@@ -0,0 +1,43 @@
+import hashlib
+
+from bin.utils.ttl_cache import TTLCache
+
+
+def normalize_input(text):
+    return " ".join(text.casefold().split())
+
+
+class ResponseCache:
+    """Gemini replies keyed by what actually shaped them.
+
+    The key hashes the normalized user input, the digests of any attached
+    images and the last `context_turns` turns of conversation, so a repeated
+    question in the same situation is answered without an API call. The
+    persona is picked at random per request, so it is left out of the key:
+    whichever persona answered first is reused.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600.0, context_turns=2):
+        self.cache = TTLCache(maxsize=maxsize, default_ttl=ttl)
+        self.context_turns = context_turns
+
+    def make_key(self, user_input, image_digests=(), history=()):
+        digest = hashlib.sha256()
+        for part in (normalize_input(user_input), *image_digests):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        context = list(history)[-self.context_turns:] if self.context_turns > 0 else []
+        for turn in context:
+            digest.update(f"{turn['author']}\0{normalize_input(turn['text'])}\0".encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, response):
+        self.cache.set(key, response)
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats["api_calls_saved"] = stats["hits"]
+        return stats
@@ -0,0 +1,203 @@
+import asyncio
+import bisect
+import difflib
+import heapq
+import time
+
+FUZZY_TRIGRAMS = 8  # Rarest trigrams of the typed text used to pick fuzzy candidates
+FUZZY_CANDIDATES = 200  # Titles compared with difflib per lookup, at most
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_index (
+    query TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    duration REAL,
+    uses INTEGER NOT NULL DEFAULT 1,
+    last_used REAL NOT NULL
+);
+"""
+
+
+def normalize_search(text):
+    text = " ".join(text.lower().split())
+    if text.startswith("ytsearch:"):
+        text = text[len("ytsearch:"):].strip()
+    return text
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IndexedTrack:
+    __slots__ = ('url', 'title', 'duration', 'uses', 'last_used', 'queries')
+
+    def __init__(self, url, title, duration=None):
+        self.url = url
+        self.title = title
+        self.duration = duration
+        self.uses = 0
+        self.last_used = 0.0
+        self.queries = set()  # normalized searches that resolved to this track
+
+
+class SearchIndex:
+    """Remembers what free-text searches resolved to, for /play autocomplete and repeat searches.
+
+    Every normalized search and every word-suffix of a track title ("never
+    gonna give you up", "gonna give you up", ...) is a key in one sorted list,
+    so a prefix lookup is a bisect plus a short scan. Results are ranked by how
+    often the track was played. Fuzzy matching only compares the titles that
+    share the most of the typed text's rarest trigrams, so its cost doesn't
+    grow with the index.
+    """
+
+    def __init__(self, store, max_tracks=5000):
+        self.store = store
+        self.max_tracks = max_tracks
+        self.tracks = {}  # url -> IndexedTrack
+        self.queries = {}  # normalized search -> url
+        self._keys = []  # sorted (key, url)
+        self._trigrams = {}  # trigram of a normalized title -> set of urls
+        self._eviction_heap = []  # (uses, last_used, url), possibly stale; see _evict
+        self.hits = 0
+        self.misses = 0
+
+    async def open(self):
+        await self.store.execute(lambda conn: conn.executescript(SCHEMA))
+        rows = await self.store.execute(
+            lambda conn: conn.execute(
+                "SELECT query, url, title, duration, uses, last_used FROM search_index ORDER BY uses DESC LIMIT ?",
+                (self.max_tracks,),
+            ).fetchall()
+        )
+        for query, url, title, duration, uses, last_used in rows:
+            # Rows keyed by URL record direct picks (autocomplete or pasted links), not searches.
+            track = self._add(None if query.startswith("http") else query, url, title, duration)
+            track.uses += uses
+            track.last_used = max(track.last_used, last_used)
+        self._rebuild_eviction_heap()
+
+    def _title_keys(self, title):
+        words = normalize_search(title).split()
+        return {" ".join(words[i:]) for i in range(len(words))}
+
+    def _add(self, query, url, title, duration):
+        track = self.tracks.get(url)
+        if track is None:
+            track = self.tracks[url] = IndexedTrack(url, title, duration)
+            for key in self._title_keys(title):
+                bisect.insort(self._keys, (key, url))
+            for trigram in trigrams(normalize_search(title)):
+                self._trigrams.setdefault(trigram, set()).add(url)
+        if query and query not in track.queries:
+            track.queries.add(query)
+            self.queries[query] = url
+            bisect.insort(self._keys, (query, url))
+        return track
+
+    def lookup(self, search):
+        """Returns the track a search resolved to before, or None."""
+        url = self.queries.get(normalize_search(search))
+        track = self.tracks.get(url) if url else None
+        if track is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return track
+
+    def get(self, url):
+        return self.tracks.get(url)
+
+    def suggest(self, text, limit=25):
+        """Returns known tracks matching `text` by prefix (falling back to fuzzy title matching), most played first."""
+        prefix = normalize_search(text)
+        if not prefix:
+            return sorted(self.tracks.values(), key=lambda t: (-t.uses, -t.last_used))[:limit]
+
+        found = {}
+        start = bisect.bisect_left(self._keys, (prefix,))
+        for key, url in self._keys[start:start + limit * 8]:
+            if not key.startswith(prefix):
+                break
+            found[url] = self.tracks[url]
+
+        if len(found) < limit and len(prefix) >= 3:
+            titles = {normalize_search(t.title): t for t in self._fuzzy_candidates(prefix)}
+            for title in difflib.get_close_matches(prefix, list(titles), n=limit - len(found), cutoff=0.6):
+                found.setdefault(titles[title].url, titles[title])
+
+        return sorted(found.values(), key=lambda t: (-t.uses, -t.last_used))[:limit]
+
+    def _fuzzy_candidates(self, text):
+        buckets = [self._trigrams[trigram] for trigram in trigrams(text) if trigram in self._trigrams]
+        buckets.sort(key=len)
+        shared = {}
+        for bucket in buckets[:FUZZY_TRIGRAMS]:
+            for url in bucket:
+                shared[url] = shared.get(url, 0) + 1
+        best = heapq.nlargest(FUZZY_CANDIDATES, shared, key=shared.get)
+        return [self.tracks[url] for url in best]
+
+    def record(self, search, url, title, duration=None):
+        """Remembers that `search` (or a direct pick of `url`) played this track."""
+        query = normalize_search(search) if search and not search.startswith("http") else None
+        track = self._add(query, url, title, duration)
+        track.uses += 1
+        track.last_used = time.time()
+        heapq.heappush(self._eviction_heap, (track.uses, track.last_used, url))
+        if len(self.tracks) > self.max_tracks:
+            self._evict()
+        asyncio.create_task(self._save(query or url, track))
+
+    async def _save(self, query, track):
+        try:
+            await self.store.execute(
+                lambda conn: conn.execute(
+                    "INSERT INTO search_index (query, url, title, duration, uses, last_used) VALUES (?, ?, ?, ?, 1, ?) "
+                    "ON CONFLICT(query) DO UPDATE SET url = excluded.url, title = excluded.title, "
+                    "uses = uses + 1, last_used = excluded.last_used",
+                    (query, track.url, track.title, track.duration, track.last_used),
+                )
+            )
+        except Exception as e:
+            print(f"Error saving search index entry: {e}")
+
+    def _evict(self):
+        victim = self._pop_least_used()
+        del self.tracks[victim.url]
+        for query in victim.queries:
+            if self.queries.get(query) == victim.url:  # It may point at another track by now.
+                del self.queries[query]
+        for key in self._title_keys(victim.title) | victim.queries:
+            i = bisect.bisect_left(self._keys, (key, victim.url))
+            if i < len(self._keys) and self._keys[i] == (key, victim.url):
+                del self._keys[i]
+        for trigram in trigrams(normalize_search(victim.title)):
+            urls = self._trigrams.get(trigram)
+            if urls is not None:
+                urls.discard(victim.url)
+                if not urls:
+                    del self._trigrams[trigram]
+
+    def _pop_least_used(self):
+        """Pops the least used track off the heap, skipping entries outdated by later plays or evictions."""
+        if len(self._eviction_heap) > 4 * len(self.tracks):
+            self._rebuild_eviction_heap()
+        while self._eviction_heap:
+            uses, last_used, url = heapq.heappop(self._eviction_heap)
+            track = self.tracks.get(url)
+            if track is not None and track.uses == uses and track.last_used == last_used:
+                return track
+        self._rebuild_eviction_heap()
+        uses, last_used, url = heapq.heappop(self._eviction_heap)
+        return self.tracks[url]
+
+    def _rebuild_eviction_heap(self):
+        self._eviction_heap = [(t.uses, t.last_used, t.url) for t in self.tracks.values()]
+        heapq.heapify(self._eviction_heap)
+
+    def stats(self):
+        return {"tracks": len(self.tracks), "queries": len(self.queries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,32 @@
+import contextlib
+import time
+
+
+class StartupProfile:
+    """Records how long each startup phase took and prints them as one report."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []  # (name, seconds)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.phases.append((name, seconds))
+        print(f"[startup] {name}: {seconds * 1000:.0f} ms")
+
+    def since_start(self):
+        return time.perf_counter() - self.started
+
+    def report(self):
+        lines = [f"Startup profile ({self.since_start():.2f}s since launch):"]
+        width = max((len(name) for name, _ in self.phases), default=0)
+        for name, seconds in self.phases:
+            lines.append(f"  {name.ljust(width)}  {seconds * 1000:8.0f} ms")
+        print("\n".join(lines))
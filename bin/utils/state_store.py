@@ -0,0 +1,176 @@
+import asyncio
+import functools
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS guild_state (
+    guild_id TEXT PRIMARY KEY,
+    volume REAL,
+    text_channel_id INTEGER,
+    voice_channel_id INTEGER,
+    current_query TEXT,
+    current_title TEXT,
+    current_duration REAL,
+    current_requester INTEGER,
+    position REAL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS queue_tracks (
+    guild_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    query TEXT NOT NULL,
+    title TEXT,
+    duration REAL,
+    requester INTEGER,
+    PRIMARY KEY (guild_id, position)
+) WITHOUT ROWID;
+"""
+
+GUILD_COLUMNS = (
+    "volume", "text_channel_id", "voice_channel_id", "current_query", "current_title",
+    "current_duration", "current_requester", "position",
+)
+
+
+class StateStore:
+    """Durable per-guild state in SQLite (WAL mode) with batched write-behind.
+
+    Callers keep the in-memory objects as the source of truth and call
+    `mark_dirty`; every `flush_interval` seconds the store asks the snapshot
+    callbacks for the dirty guilds and writes them in one transaction. All
+    SQLite work happens on a single dedicated thread, so the event loop never
+    blocks on disk I/O.
+    """
+
+    def __init__(self, path, guild_snapshot, queue_snapshot, flush_interval=2.0):
+        self.path = path
+        self.guild_snapshot = guild_snapshot  # guild_id -> dict of GUILD_COLUMNS, or None to delete
+        self.queue_snapshot = queue_snapshot  # guild_id -> list of (query, title, duration, requester)
+        self.flush_interval = flush_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-store")
+        self._conn = None
+        self._dirty_guilds = set()
+        self._dirty_queues = set()
+        self._flush_task = None
+        self.flushes = 0
+        self.rows_written = 0
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def open(self):
+        await self._run(self._connect)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only risks the last transaction on power loss, never corruption.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def mark_dirty(self, guild_id, queue=False):
+        """Schedules a guild's state row (and optionally its queue) for the next flush."""
+        self._dirty_guilds.add(guild_id)
+        if queue:
+            self._dirty_queues.add(guild_id)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing music state: {e}")
+
+    async def flush(self):
+        if not self._dirty_guilds and not self._dirty_queues:
+            return
+        guild_ids, self._dirty_guilds = self._dirty_guilds, set()
+        queue_ids, self._dirty_queues = self._dirty_queues, set()
+
+        # Snapshots are taken on the loop so they are consistent with the in-memory state.
+        guild_rows = [(guild_id, self.guild_snapshot(guild_id)) for guild_id in guild_ids]
+        queue_rows = [(guild_id, self.queue_snapshot(guild_id)) for guild_id in queue_ids]
+        try:
+            await self._run(self._write, guild_rows, queue_rows)
+        except Exception:
+            # Retry these guilds on the next flush.
+            self._dirty_guilds |= guild_ids
+            self._dirty_queues |= queue_ids
+            raise
+        self.flushes += 1
+
+    def _write(self, guild_rows, queue_rows):
+        now = time.time()
+        with self._conn:
+            for guild_id, row in guild_rows:
+                if row is None:
+                    self._conn.execute("DELETE FROM guild_state WHERE guild_id = ?", (guild_id,))
+                    continue
+                values = [row.get(column) for column in GUILD_COLUMNS]
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO guild_state (guild_id, {', '.join(GUILD_COLUMNS)}, updated_at) "
+                    f"VALUES (?, {', '.join('?' for _ in GUILD_COLUMNS)}, ?)",
+                    (guild_id, *values, now),
+                )
+                self.rows_written += 1
+            for guild_id, tracks in queue_rows:
+                self._conn.execute("DELETE FROM queue_tracks WHERE guild_id = ?", (guild_id,))
+                self._conn.executemany(
+                    "INSERT INTO queue_tracks (guild_id, position, query, title, duration, requester) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(guild_id, i, *track) for i, track in enumerate(tracks)],
+                )
+                self.rows_written += len(tracks)
+
+    async def load_volumes(self):
+        """Returns {guild_id: volume}. Cheap enough to load for every guild at startup."""
+        rows = await self._run(self._fetch, "SELECT guild_id, volume FROM guild_state WHERE volume IS NOT NULL")
+        return dict(rows)
+
+    async def load_resumable(self):
+        """Returns the state rows of guilds that were playing something when the bot stopped."""
+        columns = ", ".join(GUILD_COLUMNS)
+        rows = await self._run(
+            self._fetch, f"SELECT guild_id, {columns} FROM guild_state WHERE current_query IS NOT NULL"
+        )
+        return [dict(zip(("guild_id",) + GUILD_COLUMNS, row)) for row in rows]
+
+    async def load_queue(self, guild_id):
+        """Returns one guild's persisted queue as (query, title, duration, requester) rows."""
+        return await self._run(
+            self._fetch,
+            "SELECT query, title, duration, requester FROM queue_tracks WHERE guild_id = ? ORDER BY position",
+            (guild_id,),
+        )
+
+    async def execute(self, func, *args):
+        """Runs `func(connection, *args)` on the store's thread, for other tables sharing this database."""
+        return await self._run(self._execute, func, args)
+
+    def _execute(self, func, args):
+        with self._conn:
+            return func(self._conn, *args)
+
+    def _fetch(self, sql, params=()):
+        return self._conn.execute(sql, params).fetchall()
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        try:
+            await self.flush()
+        finally:
+            await self._run(self._close)
+            self._executor.shutdown(wait=False)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
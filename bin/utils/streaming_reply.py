@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import discord
+
+MESSAGE_LIMIT = 2000
+
+
+def split_message(text, limit=MESSAGE_LIMIT):
+    """Splits text into Discord-sized pieces, preferring to break at newlines, then spaces."""
+    pages = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        pages.append(text[:cut])
+        text = text[cut:].lstrip("\n ")
+    pages.append(text)
+    return pages
+
+
+class StreamingReply:
+    """A reply that grows while the answer is still being generated.
+
+    It starts as a placeholder message and is edited as text arrives, at most
+    once per `min_interval` seconds per message (Discord allows about five
+    edits per five seconds per channel). Text past 2000 characters continues in
+    follow-up messages.
+
+    A failed edit (rate limit, deleted message) never counts as a failure of
+    the answer itself: intermediate edits are retried by the next update, and
+    the final text is sent as a new message if its message can't be edited.
+    """
+
+    def __init__(self, channel, transform=None, min_interval=1.0, placeholder="…"):
+        self.channel = channel
+        self.transform = transform  # applied to the full text before it's shown (e.g. mention rewriting)
+        self.min_interval = min_interval
+        self.placeholder = placeholder
+        self.messages = []
+        self.contents = []
+        self.edits = 0
+        self._text = ""
+        self._last_render = 0.0
+        self._pending = None
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        self.messages.append(await self.channel.send(self.placeholder))
+        self.contents.append(self.placeholder)
+        # Not counted against the throttle: the first chunk should show up immediately.
+
+    async def update(self, text):
+        """Records the text so far; shows it now or once the edit throttle allows."""
+        self._text = text
+        if self._pending is not None:
+            return
+        wait = self._last_render + self.min_interval - time.monotonic()
+        if wait <= 0:
+            try:
+                await self._render()
+            except discord.HTTPException as e:
+                # The next update or finish() tries again.
+                print(f"Error updating streamed reply: {e}")
+        else:
+            self._pending = asyncio.create_task(self._render_later(wait))
+
+    async def _render_later(self, wait):
+        await asyncio.sleep(wait)
+        self._pending = None
+        try:
+            await self._render()
+        except Exception as e:
+            # A failed intermediate edit isn't fatal; the next update or finish() tries again.
+            print(f"Error updating streamed reply: {e}")
+
+    async def finish(self, text):
+        """Shows the final text, cancelling any throttled edit still waiting."""
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        self._text = text
+        await self._render(final=True)
+
+    async def _render(self, final=False):
+        async with self._lock:
+            text = self.transform(self._text) if self.transform else self._text
+            pages = split_message(text) if text.strip() else [self.placeholder]
+            try:
+                for i, page in enumerate(pages):
+                    if i < len(self.messages):
+                        if self.contents[i] != page:
+                            try:
+                                await self.messages[i].edit(content=page)
+                                self.edits += 1
+                            except discord.HTTPException:
+                                if not final:
+                                    raise
+                                # Keep the answer: post this page anew instead of losing it.
+                                self.messages[i] = await self.channel.send(page)
+                            self.contents[i] = page
+                    else:
+                        self.messages.append(await self.channel.send(page))
+                        self.contents.append(page)
+            finally:
+                # Failed attempts count too, so the next chunk doesn't retry an erroring API right away.
+                self._last_render = time.monotonic()
@@ -0,0 +1,123 @@
+import random
+from itertools import islice
+
+
+class Track:
+    """One queued song."""
+    __slots__ = ('query', 'title', 'duration', 'requester', 'stream')
+
+    def __init__(self, query, title, duration=None, requester=None, stream=None):
+        self.query = query  # URL or search query that yt-dlp resolves at play time
+        self.title = title
+        self.duration = duration  # Seconds, when yt-dlp reported it
+        self.requester = requester  # User ID of whoever queued it
+        self.stream = stream  # ResolvedStream once the track has been resolved
+
+    def __repr__(self):
+        return f"Track({self.title!r}, query={self.query!r})"
+
+
+class TrackQueue:
+    """Song queue with cheap indexed access and in-place reordering.
+
+    Tracks live in one list with a moving head offset: popping the front and
+    re-inserting at the front reuse the free slots before the head, so they
+    are O(1) like a deque, while indexing and slicing are O(1)/O(k) like a
+    list. Removing, inserting or moving an entry in the middle is still O(n):
+    one memmove of the list's pointers, with no copy of the queue and no
+    Track objects touched. Even for a queue of many thousands of tracks that
+    takes microseconds, which is why this doesn't use a tree or blocked list
+    for O(log n) positional updates.
+    """
+    __slots__ = ('_items', '_head')
+
+    # Compact once at least this many dead slots sit in front of the head.
+    _COMPACT_THRESHOLD = 64
+
+    def __init__(self, tracks=()):
+        self._items = list(tracks)
+        self._head = 0
+
+    def __len__(self):
+        return len(self._items) - self._head
+
+    def __bool__(self):
+        return len(self._items) > self._head
+
+    def __iter__(self):
+        return islice(self._items, self._head, None)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return self._items[self._head + start:self._head + stop]
+            return [self._items[self._head + i] for i in range(start, stop, step)]
+        return self._items[self._position(index)]
+
+    def _position(self, index):
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("queue index out of range")
+        return self._head + index
+
+    def append(self, track):
+        self._items.append(track)
+
+    def extend(self, tracks):
+        self._items.extend(tracks)
+
+    def popleft(self):
+        if not self:
+            raise IndexError("pop from an empty queue")
+        track = self._items[self._head]
+        self._items[self._head] = None
+        self._head += 1
+        if self._head == len(self._items):
+            self.clear()
+        elif self._head >= self._COMPACT_THRESHOLD and self._head * 2 >= len(self._items):
+            self._compact()
+        return track
+
+    def insert_next(self, track):
+        """Puts a track at the front of the queue."""
+        if self._head:
+            self._head -= 1
+            self._items[self._head] = track
+        else:
+            self._items.insert(0, track)
+
+    def insert(self, index, track):
+        if index <= 0:
+            self.insert_next(track)
+        else:
+            self._items.insert(self._head + min(index, len(self)), track)
+
+    def remove(self, index):
+        """Removes and returns the track at `index`. O(1) at the front, otherwise an O(n) memmove."""
+        position = self._position(index)
+        if position == self._head:
+            return self.popleft()
+        return self._items.pop(position)
+
+    def move(self, source, destination=0):
+        """Moves the track at `source` to `destination` and returns it. O(n), like `remove` plus `insert`."""
+        track = self.remove(source)
+        self.insert(destination, track)
+        return track
+
+    def shuffle(self):
+        """Shuffles the queue in place."""
+        self._compact()
+        random.shuffle(self._items)
+
+    def clear(self):
+        self._items.clear()
+        self._head = 0
+
+    def _compact(self):
+        if self._head:
+            del self._items[:self._head]
+            self._head = 0
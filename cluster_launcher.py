@@ -0,0 +1,181 @@
+# Runs the bot as several processes ("clusters"), each connecting a contiguous group of shards.
+#
+#   CLUSTER_COUNT=4 python cluster_launcher.py
+#
+# SHARD_COUNT defaults to Discord's recommendation for the token. Crashed or
+# restarted clusters are started again; Ctrl+C / SIGTERM shuts them all down.
+import asyncio
+import os
+import secrets
+import signal
+import sys
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+
+from bin.utils.cluster import split_shards
+from bin.utils.cluster_ipc import IpcHub
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main_script.py")
+IDENTIFY_INTERVAL = 5.5  # Discord allows one identify per 5 seconds (per max_concurrency bucket)
+SHUTDOWN_TIMEOUT = 30
+MAX_RESTART_DELAY = 60
+STABLE_RUNTIME = 120  # A cluster that ran this long resets its restart backoff
+
+load_dotenv()
+TOKEN = os.getenv("DISCORD_TOKEN")
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", "2"))
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+IPC_HOST = os.getenv("CLUSTER_IPC_HOST", "127.0.0.1")
+IPC_PORT = int(os.getenv("CLUSTER_IPC_PORT", "0"))  # 0 picks a free port
+
+
+async def recommended_shards():
+    """Asks Discord how many shards this bot should run, and how many may identify at once."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot", headers={"Authorization": f"Bot {TOKEN}"}
+        ) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"], data.get("session_start_limit", {}).get("max_concurrency", 1)
+
+
+def cluster_env(cluster_id, cluster_count, shard_count, shard_ids, hub):
+    env = dict(os.environ)
+    env.update({
+        "CLUSTER_ID": str(cluster_id),
+        "CLUSTER_COUNT": str(cluster_count),
+        "SHARD_COUNT": str(shard_count),
+        "SHARD_IDS": ",".join(str(shard_id) for shard_id in shard_ids),
+        "CLUSTER_IPC_HOST": hub.host,
+        "CLUSTER_IPC_PORT": str(hub.port),
+        "CLUSTER_IPC_TOKEN": hub.token,
+    })
+    # Every cluster shares the settings file, which only the sqlite backend handles safely.
+    if env.get("BOT_CONFIG_BACKEND", "json") != "sqlite":
+        env["BOT_CONFIG_BACKEND"] = "sqlite"
+        env["BOT_CONFIG_PATH"] = "bot_config.db"
+        env.setdefault("BOT_CONFIG_IMPORT", os.getenv("BOT_CONFIG_PATH", "bot_config.json"))
+    # The audio cache keeps its index in a single file, so each cluster gets its own directory.
+    if env.get("MUSIC_AUDIO_CACHE_DIR"):
+        env["MUSIC_AUDIO_CACHE_DIR"] = os.path.join(env["MUSIC_AUDIO_CACHE_DIR"], f"cluster-{cluster_id}")
+    return env
+
+
+class Cluster:
+    """One bot process and the shards it runs."""
+
+    def __init__(self, cluster_id, shard_ids, env):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.env = env
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, BOT_SCRIPT, env=self.env,
+            # Keep Ctrl+C away from the clusters; the launcher shuts them down in order.
+            start_new_session=os.name == "posix",
+        )
+        self.started_at = time.monotonic()
+        print(f"Started cluster {self.cluster_id} (shards {self.shard_ids[0]}-{self.shard_ids[-1]}, pid {self.process.pid}).")
+
+
+class Launcher:
+    def __init__(self, hub, clusters, identify_interval):
+        self.hub = hub
+        self.clusters = clusters
+        self.identify_interval = identify_interval
+        self.stopping = asyncio.Event()
+        self._identify_lock = asyncio.Lock()  # Only one cluster identifies its shards at a time
+
+    async def run(self):
+        watchers = [asyncio.create_task(self._watch(cluster)) for cluster in self.clusters]
+        await self.stopping.wait()
+        await self.shutdown()
+        await asyncio.gather(*watchers, return_exceptions=True)
+
+    async def _start(self, cluster):
+        async with self._identify_lock:
+            if self.stopping.is_set():
+                return False
+            await cluster.start()
+            # Wait for the cluster's shards before starting the next one, so identifies don't collide.
+            limit = len(cluster.shard_ids) * self.identify_interval + 60
+            ready = asyncio.create_task(self.hub.ready(cluster.cluster_id).wait())
+            exited = asyncio.create_task(cluster.process.wait())
+            await asyncio.wait({ready, exited}, timeout=limit, return_when=asyncio.FIRST_COMPLETED)
+            ready.cancel()
+            exited.cancel()
+            return True
+
+    async def _watch(self, cluster):
+        delay = 5
+        while not self.stopping.is_set():
+            if not await self._start(cluster):
+                return
+            code = await cluster.process.wait()
+            if self.stopping.is_set():
+                return
+            if time.monotonic() - cluster.started_at > STABLE_RUNTIME:
+                delay = 5
+            cluster.restarts += 1
+            print(f"Cluster {cluster.cluster_id} exited with code {code}; restarting in {delay}s.")
+            try:
+                await asyncio.wait_for(self.stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+
+    async def shutdown(self):
+        print("Shutting down clusters...")
+        running = [cluster for cluster in self.clusters if cluster.process and cluster.process.returncode is None]
+        # Ask nicely first, so each cluster saves its state and leaves voice.
+        await self.hub.call("shutdown")
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(cluster.process.wait() for cluster in running)), SHUTDOWN_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            for cluster in running:
+                if cluster.process.returncode is None:
+                    print(f"Cluster {cluster.cluster_id} did not stop in time; terminating it.")
+                    cluster.process.terminate()
+            await asyncio.gather(*(cluster.process.wait() for cluster in running))
+
+
+async def main():
+    if SHARD_COUNT:
+        shard_count, max_concurrency = int(SHARD_COUNT), 1
+    else:
+        shard_count, max_concurrency = await recommended_shards()
+    groups = split_shards(shard_count, CLUSTER_COUNT)
+    print(f"Running {shard_count} shard(s) in {len(groups)} cluster(s).")
+
+    hub = IpcHub(secrets.token_hex(16), host=IPC_HOST, port=IPC_PORT)
+    await hub.start()
+    print(f"Cluster IPC listening on {hub.host}:{hub.port}.")
+    clusters = [
+        Cluster(cluster_id, shard_ids, cluster_env(cluster_id, len(groups), shard_count, shard_ids, hub))
+        for cluster_id, shard_ids in enumerate(groups)
+    ]
+    launcher = Launcher(hub, clusters, IDENTIFY_INTERVAL / max_concurrency)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, launcher.stopping.set)
+        except NotImplementedError:  # Windows: Ctrl+C raises KeyboardInterrupt instead
+            pass
+    try:
+        await launcher.run()
+    finally:
+        await hub.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
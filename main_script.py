@@ -1,21 +1,39 @@
+# STARTUP TIMING (first, so the report includes the imports below)
+from bin.utils.startup_profile import StartupProfile
+startup = StartupProfile()
+# Heavy dependencies (yt_dlp, google.generativeai) are imported on first use or by the warm-up after ready.
+from bin.utils import lazy_import
+lazy_import.observe(startup.record)
 # MAIN IMPORTS
-import discord
-from discord.ext import commands
+with startup.phase("import discord"):
+    import discord
+    from discord.ext import commands
 from dotenv import load_dotenv
 import logging
 import os
 import asyncio
 # GENERAL BOT FUNCTIONS
-from bin.cogs.welcome_cog import setup as welcome_setup
-from bin.cogs.commands.misc_commands_cog import setup as server_setup
+with startup.phase("import welcome/server cogs"):
+    from bin.cogs.welcome_cog import setup as welcome_setup
+    from bin.cogs.commands.misc_commands_cog import setup as server_setup
+    from bin.cogs.commands.cluster_commands import setup as cluster_setup
+    from bin.cogs.metrics_cog import setup as metrics_setup
 # GEMINI IMPORTS
-from bin.cogs.gemini_cog import setup as gemini_setup
+with startup.phase("import gemini cog"):
+    from bin.cogs.gemini_cog import setup as gemini_setup
 # MUSIC IMPORTS (CORE LOGIC AND COMMANDS)
-from bin.cogs.music_cog import MusicCog, setup as music_setup
-from bin.cogs.commands.music_general_controls import setup as general_controls_setup
-from bin.cogs.commands.music_play_commands import setup as play_commands_setup
-from bin.cogs.commands.music_elevated_commands import setup as elevated_commands_setup
-    
+with startup.phase("import music cogs"):
+    from bin.cogs.music_cog import MusicCog, setup as music_setup
+    from bin.cogs.commands.music_general_controls import setup as general_controls_setup
+    from bin.cogs.commands.music_play_commands import setup as play_commands_setup
+    from bin.cogs.commands.music_elevated_commands import setup as elevated_commands_setup
+# SHARED SERVICES
+from bin.utils.config_service import ConfigService
+from bin.utils.command_sync import CommandSyncer
+from bin.utils.cluster import ClusterConfig
+from bin.utils.cluster_ipc import IpcClient
+startup.record("imports (total)", startup.since_start())
+
 
 # Logging Setup
 logger = logging.getLogger('discord')
@@ -33,6 +51,14 @@ YOUR_GUILD_ID = os.getenv("YOUR_GUILD_ID")  # Not used in this example, but kept
 YOUR_WELCOME_CHANNEL_ID = os.getenv("YOUR_WELCOME_CHANNEL_ID")  # Not used here
 YOUR_ROLE_ID = os.getenv("YOUR_ROLE_ID")  # Not used here
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")  # Not used here
+DEV_GUILD_ID = os.getenv("DEV_GUILD_ID")  # Staging: sync commands to this guild only, where they apply instantly
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "0").lower() in ("1", "true", "yes")
+AUTO_SHARD = os.getenv("AUTO_SHARD", "0").lower() in ("1", "true", "yes")  # Let Discord pick the shard count
+# Set by cluster_launcher.py when this process runs one group of shards.
+cluster = ClusterConfig.from_env()
+# Prometheus metrics at http://METRICS_HOST:METRICS_PORT/metrics; off unless a port is set. Clusters use port + cluster ID.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.getenv("METRICS_PORT")
 # Setting Intents (Good as-is)
 intents = discord.Intents.default()
 intents.message_content = True
@@ -40,46 +66,100 @@ intents.members = True  # Needed for on_member_join events (if you use it)
 intents.voice_states = True
 
 # Bot Initialization
-bot = commands.Bot(command_prefix="!", intents=intents)
+if cluster.sharded or AUTO_SHARD:
+    bot = commands.AutoShardedBot(
+        command_prefix="!", intents=intents, shard_count=cluster.shard_count, shard_ids=cluster.shard_ids
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
+ipc = IpcClient(cluster.cluster_id, cluster.ipc_port, cluster.ipc_token, host=cluster.ipc_host) if cluster.clustered else None
+
+# on_ready fires again after every reconnect; the syncer only does work the first time, and only if commands changed.
+# Commands are global, so in a cluster only the first process syncs them.
+command_syncer = CommandSyncer(bot.tree, guild_id=DEV_GUILD_ID, force=FORCE_COMMAND_SYNC) if cluster.cluster_id == 0 else None
+connect_started = None
+ready_handled = False
+warm_up_task = None
 
-# No longer needed: bot.synced = False
+async def sync_commands():
+    try:
+        with startup.phase("command sync"):
+            synced = await command_syncer.sync()
+        if synced is not None:
+            scope = f"to guild {DEV_GUILD_ID}" if DEV_GUILD_ID else "globally"
+            print(f"Synced {len(synced)} command(s) {scope}.")
+            for command in synced:
+                print(f"  - {command.name}")
+    except Exception as e:
+        print(f"Error syncing commands: {e}")
 
 @bot.event
 async def on_ready():
     print(f"{bot.user} is online!")
     await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name="over your server!")) # Added Status to Bot
     print("on_ready event triggered.")  # Add this line
-    try:
-        print("Attempting to sync commands...") #add this line
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s) globally.")
-        for command in synced:
-            print(f"  - {command.name}")
-    except Exception as e:
-        print(f"Error syncing commands: {e}")
+    if ipc is not None:
+        await ipc.mark_ready()
+    global ready_handled, warm_up_task
+    if ready_handled:
+        if command_syncer is not None and not command_syncer.done:
+            await sync_commands()  # The first attempt failed; retry after the reconnect.
+        return
+    ready_handled = True
+
+    startup.record("connect until ready", startup.since_start() - connect_started)
+    if command_syncer is not None:
+        await sync_commands()
+    startup.report()
+    warm_up_task = asyncio.create_task(lazy_import.warm_up())
     print("on_ready event finished.") #add this line
 
 # Main Function
 async def main():
-    # 1. Create the MusicCog instance
+    global connect_started
+    # 1. Load the per-guild settings every cog shares, and create the MusicCog instance
+    with startup.phase("config"):
+        config = ConfigService(
+            path=os.getenv("BOT_CONFIG_PATH", "bot_config.json"),
+            backend=os.getenv("BOT_CONFIG_BACKEND", "json"),
+            import_path=os.getenv("BOT_CONFIG_IMPORT"),
+        )
+        await config.open()
     music_cog = MusicCog(bot)
 
     # 2. Load the cogs using their setup functions.
-    await music_setup(bot)  # Load MusicCog (core logic)
+    with startup.phase("setup music"):
+        await music_setup(bot, music_cog)  # Load MusicCog (core logic), sharing the instance the commands use
     # Music Commands
-    await general_controls_setup(bot, music_cog)
-    await play_commands_setup(bot, music_cog)
-    await elevated_commands_setup(bot, music_cog)
+    with startup.phase("setup music commands"):
+        await general_controls_setup(bot, music_cog)
+        await play_commands_setup(bot, music_cog)
+        await elevated_commands_setup(bot, music_cog, config)
     # General Bot Setup
-    await welcome_setup(bot)
-    await server_setup(bot)
+    with startup.phase("setup welcome/server"):
+        await welcome_setup(bot, config)
+        await server_setup(bot)
+        await cluster_setup(bot, cluster, ipc)
+        if METRICS_PORT:
+            await metrics_setup(bot, METRICS_HOST, int(METRICS_PORT) + cluster.cluster_id)
     # Gemini API Setup
-    await gemini_setup(bot)
+    with startup.phase("setup gemini"):
+        await gemini_setup(bot, config)
 
 
 
     # 3. Start the bot using bot.start() within the async main function.
-    await bot.start(TOKEN)
+    connect_started = startup.since_start()
+    if ipc is not None:
+        shards = ", ".join(str(shard_id) for shard_id in cluster.shard_ids) if cluster.shard_ids else "all"
+        print(f"Cluster {cluster.cluster_id}/{cluster.cluster_count}: shards {shards} of {cluster.shard_count}")
+        ipc.start()
+    try:
+        await bot.start(TOKEN)
+    finally:
+        if ipc is not None:
+            await ipc.close()
+        await config.close()
 
 
 if __name__ == "__main__":
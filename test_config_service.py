@@ -0,0 +1,28 @@
+import asyncio
+import json
+
+from bin.utils.config_service import ConfigService
+
+
+def test_corrupt_file_keeps_settings_in_memory_and_on_disk(tmp_path):
+    path = tmp_path / "bot_config.json"
+    path.write_text(json.dumps({"1": {"music": {"volume": 1}}, "2": {"music": {"volume": 2}}}))
+
+    async def scenario():
+        config = ConfigService(str(path), flush_delay=0, poll_interval=0)
+        await config.open()
+        path.write_text('{"1": {"mus')  # A half-written edit.
+        assert await config._run(config.backend.changed_externally)
+        await config.reload()
+        assert config.get(1, "music", "volume") == 1
+        assert not await config._run(config.backend.changed_externally)  # Not retried on every poll.
+
+        config.set(3, "music", "volume", 3)
+        await config.close()
+
+    asyncio.run(scenario())
+    assert json.loads(path.read_text()) == {
+        "1": {"music": {"volume": 1}},
+        "2": {"music": {"volume": 2}},
+        "3": {"music": {"volume": 3}},
+    }
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from bin.utils.fair_scheduler import REASON_QUEUE_FULL, REASON_RATE_LIMITED, FairScheduler, SchedulerBusy
+
+
+async def _queue_requests(scheduler, guild_ids, admitted):
+    """Starts one waiting request per guild ID; each appends its guild to `admitted` once admitted."""
+    async def request(guild_id):
+        await scheduler.acquire(guild_id)
+        admitted.append(guild_id)
+
+    tasks = [asyncio.create_task(request(guild_id)) for guild_id in guild_ids]
+    await asyncio.sleep(0)  # Let every request reach its queue.
+    return tasks
+
+
+async def _drain(scheduler, tasks, admitted):
+    """Releases one slot at a time until every queued request has been admitted."""
+    while len(admitted) < len(tasks):
+        scheduler.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+
+def test_admits_immediately_under_capacity():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrent=2, burst=10)
+        await scheduler.acquire("a")
+        await scheduler.acquire("b")
+        assert scheduler.in_flight == 2
+        assert scheduler.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_round_robin_between_guilds():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrent=1, burst=10)
+        await scheduler.acquire("busy")  # Occupy the only slot so everything else queues.
+        admitted = []
+        tasks = await _queue_requests(scheduler, ["a", "a", "a", "b", "b", "b"], admitted)
+        assert scheduler.waiting == 6
+        await _drain(scheduler, tasks, admitted)
+        assert admitted == ["a", "b", "a", "b", "a", "b"]
+        assert scheduler.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_weights_give_proportional_turns():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrent=1, burst=10, weights={"a": 2.0})
+        await scheduler.acquire("busy")
+        admitted = []
+        tasks = await _queue_requests(scheduler, ["a"] * 4 + ["b"] * 2, admitted)
+        await _drain(scheduler, tasks, admitted)
+        assert admitted == ["a", "a", "b", "a", "a", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_is_skipped_without_charging_its_guild():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrent=1, burst=10)
+        await scheduler.acquire("busy")
+        admitted = []
+        tasks = await _queue_requests(scheduler, ["a", "a", "b"], admitted)
+
+        # Cancel the first waiter and release before it gets to run its cleanup.
+        tasks[0].cancel()
+        scheduler.release()
+        await asyncio.sleep(0)
+
+        assert admitted == ["a"]  # The second "a" took the turn, no InvalidStateError.
+        assert scheduler.in_flight == 1
+        assert scheduler.waiting == 1
+        with pytest.raises(asyncio.CancelledError):
+            await tasks[0]
+        assert scheduler.waiting == 1  # The cleanup didn't count the cancelled waiter twice.
+
+        await _drain(scheduler, tasks[1:], admitted)
+        assert admitted == ["a", "b"]
+        assert scheduler.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrent=1, burst=10)
+        await scheduler.acquire("busy")
+        admitted = []
+        tasks = await _queue_requests(scheduler, ["a"], admitted)
+        tasks[0].cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tasks[0]
+        assert scheduler.waiting == 0
+        scheduler.release()
+        assert scheduler.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_releases_on_error():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrent=1, burst=10)
+        with pytest.raises(RuntimeError):
+            async with scheduler.slot("a"):
+                raise RuntimeError("boom")
+        assert scheduler.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_refuses_over_rate_and_when_queue_is_full():
+    async def rate_limited():
+        scheduler = FairScheduler(max_concurrent=5, rate=0.0, burst=1)
+        await scheduler.acquire("a")
+        with pytest.raises(SchedulerBusy) as busy:
+            await scheduler.acquire("a")
+        assert busy.value.reason == REASON_RATE_LIMITED
+        assert scheduler.rate_limited == 1
+
+    async def queue_full():
+        scheduler = FairScheduler(max_concurrent=1, max_queue=1, burst=10)
+        await scheduler.acquire("busy")
+        tasks = await _queue_requests(scheduler, ["a"], [])
+        with pytest.raises(SchedulerBusy) as busy:
+            await scheduler.acquire("b")
+        assert busy.value.reason == REASON_QUEUE_FULL
+        assert scheduler.dropped == 1
+        scheduler.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(rate_limited())
+    asyncio.run(queue_full())
+
+
+def test_rejects_non_positive_weights():
+    for weight in (0.0, -1.0, float("nan")):
+        with pytest.raises(ValueError):
+            FairScheduler(weights={"a": weight})
+
+
+def test_small_weights_still_admit():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrent=1, burst=10, weights={"a": 0.25, "b": 0.5})
+        await scheduler.acquire("busy")
+        admitted = []
+        tasks = await _queue_requests(scheduler, ["a"] * 2 + ["b"] * 4, admitted)
+        await asyncio.wait_for(_drain(scheduler, tasks, admitted), timeout=1)
+        assert admitted == ["b", "a", "b", "b", "a", "b"]
+
+    asyncio.run(scenario())